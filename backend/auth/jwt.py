@@ -1,11 +1,22 @@
+import base64
+import hmac
+import json
+import time
 from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
+from functools import lru_cache
+from jose import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from config import settings
+from config import settings, JWT_SECRET_BYTES
 
 security = HTTPBearer()
 
+_DIGEST = {"HS256": "sha256", "HS384": "sha384", "HS512": "sha512"}[settings.JWT_ALGORITHM]
+# We only ever mint tokens with this exact header (jose sorts keys, no spaces)
+_EXPECTED_HEADER_B64 = base64.urlsafe_b64encode(
+    json.dumps({"alg": settings.JWT_ALGORITHM, "typ": "JWT"}, separators=(",", ":"), sort_keys=True).encode()
+).rstrip(b"=")
+
 
 def create_token(username: str) -> dict:
     expire = datetime.now(timezone.utc) + timedelta(days=settings.JWT_EXPIRE_DAYS)
@@ -14,28 +25,43 @@ def create_token(username: str) -> dict:
     return {"token": token, "expires_at": expire.isoformat()}
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    try:
-        payload = jwt.decode(
-            credentials.credentials,
-            settings.JWT_SECRET,
-            algorithms=[settings.JWT_ALGORITHM],
-        )
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return username
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+def _b64decode(segment: bytes) -> bytes:
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+@lru_cache(maxsize=4096)
+def _decode_token(token: str) -> tuple[str, int]:
+    """Check header and signature, return (username, exp). Raises ValueError."""
+    header, payload, signature = token.encode().split(b".")
+    if not hmac.compare_digest(header, _EXPECTED_HEADER_B64):
+        raise ValueError("Invalid token")
+    expected = hmac.digest(JWT_SECRET_BYTES, header + b"." + payload, _DIGEST)
+    if not hmac.compare_digest(expected, _b64decode(signature)):
+        raise ValueError("Invalid token")
+    claims = json.loads(_b64decode(payload))
+    if not isinstance(claims, dict):
+        raise ValueError("Invalid token")
+    username = claims.get("sub")
+    exp = claims.get("exp")
+    if username is None or not isinstance(exp, int):
+        raise ValueError("Invalid token")
+    return username, exp
 
 
 def verify_token_from_string(token: str) -> str:
     """Verify a token string directly (used for WebSocket auth)."""
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise ValueError("Invalid token")
-        return username
-    except JWTError:
+        username, exp = _decode_token(token)
+    except ValueError:
         raise ValueError("Invalid token")
+    # Cached entries stay valid only until the token's own expiry
+    if exp < time.time():
+        raise ValueError("Invalid token")
+    return username
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    try:
+        return verify_token_from_string(credentials.credentials)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -2,18 +2,25 @@ import hashlib
 import hmac
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-from config import settings
+from config import settings, JWT_SECRET_BYTES
 from auth.jwt import create_token
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
-def _hash_password(password: str) -> str:
-    return hashlib.sha256((password + settings.JWT_SECRET).encode()).hexdigest()
+# BLAKE2b keys are capped at 64 bytes; longer secrets are condensed first
+_SECRET_BYTES = JWT_SECRET_BYTES
+if len(_SECRET_BYTES) > hashlib.blake2b.MAX_KEY_SIZE:
+    _SECRET_BYTES = hashlib.blake2b(_SECRET_BYTES).digest()
+
+
+def _hash_password(password: str) -> bytes:
+    return hashlib.blake2b(password.encode(), key=_SECRET_BYTES, digest_size=32).digest()
 
 
 # Hash the admin password at startup
 _admin_password_hash = _hash_password(settings.ADMIN_PASSWORD)
+_admin_username_bytes = settings.ADMIN_USERNAME.encode()
 
 
 class LoginRequest(BaseModel):
@@ -28,8 +35,9 @@ class LoginResponse(BaseModel):
 
 @router.post("/login", response_model=LoginResponse)
 async def login(req: LoginRequest):
-    if req.username != settings.ADMIN_USERNAME or not hmac.compare_digest(
-        _hash_password(req.password), _admin_password_hash
-    ):
+    # Check both in constant time, without short-circuiting on the username
+    username_ok = hmac.compare_digest(req.username.encode(), _admin_username_bytes)
+    password_ok = hmac.compare_digest(_hash_password(req.password), _admin_password_hash)
+    if not (username_ok and password_ok):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     return create_token(req.username)
@@ -2,15 +2,16 @@ import uuid
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import aiosqlite
 from auth.jwt import verify_token
-from database import DB_PATH
+from database import db_pool
 
 router = APIRouter(prefix="/api/bookmarks", tags=["bookmarks"])
 
+_SERVER_COLUMNS = ("id", "name", "host", "user", "description", "created_at")
+
 
 async def init_bookmarks_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS server_bookmarks (
                 id TEXT PRIMARY KEY,
@@ -21,6 +22,7 @@ async def init_bookmarks_db():
                 created_at TEXT NOT NULL
             )
         """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_created ON server_bookmarks(created_at)")
         await db.commit()
 
 
@@ -33,18 +35,19 @@ class ServerCreate(BaseModel):
 
 @router.get("/servers")
 async def list_servers(username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM server_bookmarks ORDER BY created_at")
+    async with db_pool.reader() as db:
+        cursor = await db.execute(
+            f"SELECT {', '.join(_SERVER_COLUMNS)} FROM server_bookmarks ORDER BY created_at"
+        )
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    return [dict(zip(_SERVER_COLUMNS, row)) for row in rows]
 
 
 @router.post("/servers")
 async def create_server(body: ServerCreate, username: str = Depends(verify_token)):
     sid = str(uuid.uuid4())[:8]
     now = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute(
             "INSERT INTO server_bookmarks (id, name, host, user, description, created_at) VALUES (?, ?, ?, ?, ?, ?)",
             (sid, body.name, body.host, body.user, body.description, now),
@@ -55,7 +58,7 @@ async def create_server(body: ServerCreate, username: str = Depends(verify_token
 
 @router.delete("/servers/{server_id}")
 async def delete_server(server_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         cursor = await db.execute("DELETE FROM server_bookmarks WHERE id = ?", (server_id,))
         await db.commit()
         if cursor.rowcount == 0:
@@ -1,13 +1,18 @@
 import asyncio
-import json
 import logging
 import os
 import pwd
+import orjson
+from functools import lru_cache
 from typing import AsyncGenerator, Tuple
 
 logger = logging.getLogger(__name__)
 
+# stream-json emits one event per line; tool results can make single lines large
+STREAM_LINE_LIMIT = 16 * 1024 * 1024
 
+
+@lru_cache(maxsize=1)
 def _get_claude_user():
     """Get uid/gid for the 'claude' user (non-root) to run CLI commands."""
     try:
@@ -17,12 +22,27 @@ def _get_claude_user():
         return None, None
 
 
-def _parse_stream_event(line: str) -> list[Tuple[str, str]]:
+# Built once instead of copying os.environ per call; the subprocess only reads it
+_CLAUDE_ENV = dict(os.environ)
+if _get_claude_user()[0] is not None:
+    _CLAUDE_ENV.update(HOME="/home/claude", USER="claude")
+
+
+# tool_use input fields to show as the description, in order of preference
+_TOOL_DESC_KEYS = ("description", "command", "pattern", "query", "file_path", "prompt")
+
+
+def _truncate(s: str, n: int) -> str:
+    return s if len(s) <= n else s[:n] + "..."
+
+
+def _parse_stream_event(line: bytes) -> list[Tuple[str, str]]:
     """Parse a stream-json event line and return (content, type) tuples."""
     try:
-        event = json.loads(line)
-    except json.JSONDecodeError:
-        return [(line, "text")] if line.strip() else []
+        event = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        text = line.decode("utf-8", errors="replace")
+        return [(text, "text")] if text.strip() else []
 
     event_type = event.get("type", "")
     results = []
@@ -41,7 +61,11 @@ def _parse_stream_event(line: str) -> list[Tuple[str, str]]:
                 tool_name = block.get("name", "unknown")
                 tool_input = block.get("input", {})
                 # Show what tool is being used
-                desc = tool_input.get("description", "") or tool_input.get("command", "") or tool_input.get("pattern", "") or tool_input.get("query", "") or tool_input.get("file_path", "") or tool_input.get("prompt", "")
+                desc = ""
+                for key in _TOOL_DESC_KEYS:
+                    if value := tool_input.get(key):
+                        desc = value
+                        break
                 if desc:
                     results.append((f"[{tool_name}] {desc}", "tool_use"))
                 else:
@@ -57,14 +81,11 @@ def _parse_stream_event(line: str) -> list[Tuple[str, str]]:
             stdout = tool_result.get("stdout", "")
             stderr = tool_result.get("stderr", "")
             if stdout:
-                display = stdout[:500] + ("..." if len(stdout) > 500 else "")
-                results.append((display, "tool_result"))
+                results.append((_truncate(stdout, 500), "tool_result"))
             if stderr:
-                display = stderr[:300] + ("..." if len(stderr) > 300 else "")
-                results.append((display, "error"))
+                results.append((_truncate(stderr, 300), "error"))
         elif isinstance(tool_result, str) and tool_result:
-            display = tool_result[:500] + ("..." if len(tool_result) > 500 else "")
-            results.append((display, "tool_result"))
+            results.append((_truncate(tool_result, 500), "tool_result"))
         else:
             # Fallback: parse from content blocks
             for block in content_blocks:
@@ -73,16 +94,14 @@ def _parse_stream_event(line: str) -> list[Tuple[str, str]]:
                 if block.get("type") == "tool_result":
                     content = block.get("content", "")
                     if isinstance(content, str) and content:
-                        display = content[:500] + ("..." if len(content) > 500 else "")
-                        results.append((display, "tool_result"))
+                        results.append((_truncate(content, 500), "tool_result"))
                     elif isinstance(content, list):
                         # content can be a list of content blocks
                         for item in content:
                             if isinstance(item, dict) and item.get("type") == "text":
                                 text = item.get("text", "")
                                 if text:
-                                    display = text[:500] + ("..." if len(text) > 500 else "")
-                                    results.append((display, "tool_result"))
+                                    results.append((_truncate(text, 500), "tool_result"))
 
     elif event_type == "result":
         # Final result - we use this as the definitive text
@@ -93,72 +112,75 @@ def _parse_stream_event(line: str) -> list[Tuple[str, str]]:
     return results
 
 
-async def call_claude_code(
-    prompt: str, working_dir: str = None, continue_session: bool = False
-) -> AsyncGenerator[Tuple[str, str], None]:
-    """
-    Call Claude Code CLI with stream-json output and yield (chunk, type) tuples.
-    Types: "text", "tool_use", "tool_result", "error", "result"
-    """
-    uid, gid = _get_claude_user()
+CLI_NOT_FOUND = "Claude Code CLI not found. Please install it: npm install -g @anthropic-ai/claude-code"
 
-    def _demote():
-        if uid is not None:
-            os.setgid(gid)
-            os.setuid(uid)
-
-    cmd = ["claude", "-p", prompt, "--output-format", "stream-json", "--verbose", "--dangerously-skip-permissions"]
-    if continue_session:
-        cmd.append("--continue")
-
-    env = os.environ.copy()
-    if uid is not None:
-        env["HOME"] = "/home/claude"
-        env["USER"] = "claude"
 
+def _resolve_working_dir(working_dir: str | None) -> str:
     # Ensure working directory exists, fallback to home dir
     if working_dir and not os.path.isdir(working_dir):
         try:
             os.makedirs(working_dir, exist_ok=True)
         except OSError:
             # Cannot create dir, fallback to a safe default
-            working_dir = env.get("HOME", os.path.expanduser("~"))
+            working_dir = _CLAUDE_ENV.get("HOME", os.path.expanduser("~"))
 
     if not working_dir or not os.path.isdir(working_dir):
-        working_dir = env.get("HOME", os.path.expanduser("~"))
+        working_dir = _CLAUDE_ENV.get("HOME", os.path.expanduser("~"))
+    return working_dir
+
+
+async def _spawn_claude(cmd: list[str], working_dir: str | None, **kwargs) -> asyncio.subprocess.Process:
+    """Start the CLI as the 'claude' user when it exists. Raises FileNotFoundError."""
+    uid, gid = _get_claude_user()
+
+    def _demote():
+        if uid is not None:
+            os.setgid(gid)
+            os.setuid(uid)
+
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=_resolve_working_dir(working_dir),
+        preexec_fn=_demote if uid is not None else None,
+        env=_CLAUDE_ENV,
+        **kwargs,
+    )
+
+
+async def call_claude_code(
+    prompt: str, working_dir: str = None, continue_session: bool = False
+) -> AsyncGenerator[Tuple[str, str], None]:
+    """
+    Call Claude Code CLI with stream-json output and yield (chunk, type) tuples.
+    Types: "text", "tool_use", "tool_result", "error", "result"
+    """
+    cmd = ["claude", "-p", prompt, "--output-format", "stream-json", "--verbose", "--dangerously-skip-permissions"]
+    if continue_session:
+        cmd.append("--continue")
 
     try:
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=working_dir,
-            preexec_fn=_demote if uid is not None else None,
-            env=env,
-        )
+        process = await _spawn_claude(cmd, working_dir, limit=STREAM_LINE_LIMIT)
     except FileNotFoundError:
-        yield ("Claude Code CLI not found. Please install it: npm install -g @anthropic-ai/claude-code", "error")
+        yield (CLI_NOT_FOUND, "error")
         return
 
-    buffer = ""
     while True:
-        chunk = await process.stdout.read(4096)
-        if not chunk:
+        try:
+            raw = await process.stdout.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # EOF: whatever is left is the final (unterminated) line
+            raw = e.partial
+        except asyncio.LimitOverrunError as e:
+            # Line longer than the stream limit: take what is buffered so far
+            raw = await process.stdout.read(e.consumed)
+        if not raw:
             break
-        text = chunk.decode("utf-8", errors="replace")
-        buffer += text
-
-        # Process complete JSON lines
-        while "\n" in buffer:
-            line, buffer = buffer.split("\n", 1)
-            if not line.strip():
-                continue
-            for content, chunk_type in _parse_stream_event(line):
-                yield (content, chunk_type)
-
-    # Flush remaining buffer
-    if buffer.strip():
-        for content, chunk_type in _parse_stream_event(buffer):
+        line = raw.rstrip(b"\n")
+        if not line.strip():
+            continue
+        for content, chunk_type in _parse_stream_event(line):
             yield (content, chunk_type)
 
     await process.wait()
@@ -167,3 +189,25 @@ async def call_claude_code(
         stderr = await process.stderr.read()
         if stderr:
             yield (stderr.decode("utf-8", errors="replace"), "error")
+
+
+async def run_claude_code(prompt: str, working_dir: str = None) -> str:
+    """
+    Call Claude Code CLI once with json output and return only the final result text.
+    For callers that don't need the intermediate stream; errors come back as the text.
+    """
+    cmd = ["claude", "-p", prompt, "--output-format", "json", "--dangerously-skip-permissions"]
+    try:
+        process = await _spawn_claude(cmd, working_dir)
+    except FileNotFoundError:
+        return CLI_NOT_FOUND
+
+    stdout, stderr = await process.communicate()
+    try:
+        event = orjson.loads(stdout)
+        result = event.get("result", "") if isinstance(event, dict) else ""
+    except orjson.JSONDecodeError:
+        result = stdout.decode("utf-8", errors="replace")
+    if not result and process.returncode != 0:
+        result = stderr.decode("utf-8", errors="replace")
+    return result
@@ -1,11 +1,57 @@
-import json
+import asyncio
 import uuid
+import orjson
 from datetime import datetime, timezone
 from fastapi import WebSocket, WebSocketDisconnect
-import aiosqlite
 from chat.claude_code import call_claude_code
 from sessions.brain import build_context_prompt
-from config import settings
+from database import db_pool
+
+
+async def _send(websocket: WebSocket, payload: dict):
+    # orjson instead of send_json's stdlib json; still a text frame for the client
+    await websocket.send_text(orjson.dumps(payload).decode())
+
+
+# Shared by every turn so sqlite3's per-connection statement cache keeps the
+# compiled statements on the pooled writer
+INSERT_SESSION_SQL = "INSERT OR IGNORE INTO sessions (id, created_at, updated_at, title) VALUES (?, ?, ?, ?)"
+INSERT_MSG_SQL = "INSERT INTO messages (session_id, role, content, attachments, timestamp) VALUES (?, ?, ?, ?, ?)"
+UPDATE_SESSION_SQL = "UPDATE sessions SET updated_at = ? WHERE id = ?"
+
+# Chunks arriving within this window go out as one frame
+BATCH_WINDOW = 0.01
+# These end a batch immediately instead of waiting out the window
+FLUSH_NOW_TYPES = frozenset({"result", "error"})
+
+
+async def _flush_chunks(websocket: WebSocket, queue: asyncio.Queue):
+    """Send queued (text, type) chunks as batched frames until a None sentinel."""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        batch = [item]
+        deadline = loop.time() + BATCH_WINDOW
+        closed = False
+        while item[1] not in FLUSH_NOW_TYPES:
+            timeout = deadline - loop.time()
+            try:
+                item = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                closed = True
+                break
+            batch.append(item)
+        await _send(websocket, {
+            "type": "chunks",
+            # chunk_type: "text", "tool_use", "tool_result", "error", "result"
+            "items": [{"content": text, "chunk_type": kind} for text, kind in batch],
+        })
+        if closed:
+            return
 
 
 async def chat_handler(websocket: WebSocket, username: str):
@@ -15,7 +61,7 @@ async def chat_handler(websocket: WebSocket, username: str):
     try:
         while True:
             raw = await websocket.receive_text()
-            data = json.loads(raw)
+            data = orjson.loads(raw)
             msg_type = data.get("type", "message")
 
             if msg_type != "message":
@@ -27,7 +73,7 @@ async def chat_handler(websocket: WebSocket, username: str):
             is_first_message = data.get("is_first_message", False)
 
             if not content and not attachments:
-                await websocket.send_json({"type": "error", "message": "Empty message"})
+                await _send(websocket, {"type": "error", "message": "Empty message"})
                 continue
 
             # Build the prompt — inject brain context only on first message
@@ -35,65 +81,70 @@ async def chat_handler(websocket: WebSocket, username: str):
             full_prompt = build_context_prompt(content, is_first_message=is_new_session or is_first_message)
 
             # If attachments include file paths, append them to prompt
-            for att in attachments:
-                path = att.get("path", "")
-                if path:
-                    full_prompt += f"\n\n[Attached file: {path}]"
+            attached = [f"\n\n[Attached file: {att['path']}]" for att in attachments if att.get("path")]
+            if attached:
+                full_prompt = "".join((full_prompt, *attached))
 
-            # Create or reuse session
+            # Create or reuse session and save the user message in one transaction
             now = datetime.now(timezone.utc).isoformat()
-            if not session_id:
-                session_id = str(uuid.uuid4())
-                async with aiosqlite.connect(settings.DATABASE_PATH) as db:
-                    await db.execute(
-                        "INSERT INTO sessions (id, created_at, updated_at, title) VALUES (?, ?, ?, ?)",
-                        (session_id, now, now, content[:50]),
-                    )
-                    await db.commit()
-
-            # Save user message
-            async with aiosqlite.connect(settings.DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
+                await db.execute("BEGIN IMMEDIATE")
+                if not session_id:
+                    session_id = str(uuid.uuid4())
+                # No-op for existing sessions; recreates a stale (deleted) one so the
+                # messages foreign key holds
+                await db.execute(
+                    INSERT_SESSION_SQL,
+                    (session_id, now, now, content[:50]),
+                )
                 await db.execute(
-                    "INSERT INTO messages (session_id, role, content, attachments, timestamp) VALUES (?, ?, ?, ?, ?)",
-                    (session_id, "user", content, json.dumps(attachments), now),
+                    INSERT_MSG_SQL,
+                    (session_id, "user", content, orjson.dumps(attachments).decode(), now),
                 )
                 await db.commit()
 
             # Notify client of session_id
-            await websocket.send_json({"type": "session_id", "session_id": session_id})
+            await _send(websocket, {"type": "session_id", "session_id": session_id})
 
             # Stream Claude Code output with type classification
             final_result = ""
+            queue: asyncio.Queue = asyncio.Queue()
+            flusher = asyncio.create_task(_flush_chunks(websocket, queue))
             try:
                 async for chunk_text, chunk_type in call_claude_code(full_prompt):
                     if chunk_type == "result":
                         # Final result from Claude - this is the definitive answer
                         final_result = chunk_text
-                    await websocket.send_json({
-                        "type": "chunk",
-                        "content": chunk_text,
-                        "chunk_type": chunk_type,  # "text", "tool_use", "tool_result", "error", "result"
-                    })
+                    queue.put_nowait((chunk_text, chunk_type))
+                    if flusher.done():
+                        # Send failed (client gone); stop reading and let await re-raise
+                        break
             except Exception as e:
-                await websocket.send_json({"type": "error", "message": str(e)})
+                queue.put_nowait(None)
+                await flusher
+                await _send(websocket, {"type": "error", "message": str(e)})
                 continue
+            queue.put_nowait(None)
+            await flusher
 
             # Save assistant message - use final_result if available
             assistant_content = final_result
-            async with aiosqlite.connect(settings.DATABASE_PATH) as db:
+            end_ts = datetime.now(timezone.utc).isoformat()
+            async with db_pool.writer() as db:
+                await db.execute("BEGIN IMMEDIATE")
                 await db.execute(
-                    "INSERT INTO messages (session_id, role, content, attachments, timestamp) VALUES (?, ?, ?, ?, ?)",
-                    (session_id, "assistant", assistant_content, "[]", datetime.now(timezone.utc).isoformat()),
+                    INSERT_MSG_SQL,
+                    (session_id, "assistant", assistant_content, "[]", end_ts),
                 )
-                await db.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (datetime.now(timezone.utc).isoformat(), session_id))
+                await db.execute(UPDATE_SESSION_SQL, (end_ts, session_id))
                 await db.commit()
 
-            await websocket.send_json({"type": "done", "session_id": session_id})
+            await _send(websocket, {"type": "done", "session_id": session_id})
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         try:
-            await websocket.send_json({"type": "error", "message": str(e)})
+            await _send(websocket, {"type": "error", "message": str(e)})
         except Exception:
             pass
@@ -25,3 +25,6 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
+
+# Derived once; the secret never changes at runtime
+JWT_SECRET_BYTES: bytes = settings.JWT_SECRET.encode()
@@ -1,20 +1,18 @@
-import aiosqlite
 from config import settings
+from db_pool import DBPool
 
 DB_PATH = settings.DATABASE_PATH
 
+db_pool = DBPool(DB_PATH)
+
 
 async def get_db():
-    db = await aiosqlite.connect(DB_PATH)
-    db.row_factory = aiosqlite.Row
-    try:
+    async with db_pool.reader() as db:
         yield db
-    finally:
-        await db.close()
 
 
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS sessions (
                 id TEXT PRIMARY KEY,
@@ -37,4 +35,38 @@ async def init_db():
                 FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
             )
         """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages(session_id, timestamp)")
+        # A prefix of idx_messages_session_ts that only added a write per insert
+        await db.execute("DROP INDEX IF EXISTS idx_messages_session_id")
+        # Lets newest-first searches walk the index and stop at their LIMIT
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(timestamp)")
+
+        # Full-text index over messages.content for search; trigram keeps the
+        # old case-insensitive substring semantics of LIKE '%kw%'
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+        fts_exists = await cursor.fetchone() is not None
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, content='messages', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        if not fts_exists:
+            # Index messages written before the table existed
+            await db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
         await db.commit()
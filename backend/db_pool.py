@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Applied to every pooled connection when it is opened
+PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA busy_timeout=5000;
+    PRAGMA foreign_keys=ON;
+    PRAGMA wal_autocheckpoint=1000;
+    PRAGMA mmap_size=268435456;
+"""
+
+# How often the writer refreshes query-planner statistics
+OPTIMIZE_INTERVAL = 3600
+
+
+class DBPool:
+    """Long-lived SQLite connections: one writer plus a queue of readers.
+
+    WAL mode lets the readers run concurrently with the single writer, and
+    keeping connections open avoids a thread spawn + file open per request.
+    """
+
+    def __init__(self, path: str, readers: int | None = None):
+        self.path = path
+        self.size = readers or os.cpu_count() or 4
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._optimizer: asyncio.Task | None = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path)
+        db.row_factory = aiosqlite.Row
+        await db.executescript(PRAGMAS)
+        return db
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        # Open the writer first so journal_mode=WAL is set before readers attach
+        self._writer = await self._connect()
+        cursor = await self._writer.execute("PRAGMA journal_mode")
+        mode = (await cursor.fetchone())[0]
+        if mode != "wal":
+            # e.g. a filesystem without shared-memory support; reads will block on writes
+            logger.warning(f"SQLite journal_mode is {mode!r}, not 'wal', for {self.path}")
+        for _ in range(self.size):
+            db = await self._connect()
+            self._all_readers.append(db)
+            self._readers.put_nowait(db)
+        self._optimizer = asyncio.create_task(self._optimize_loop())
+
+    async def optimize(self):
+        """Run PRAGMA optimize so the planner's stats keep up as tables grow."""
+        async with self.writer() as db:
+            await db.execute("PRAGMA optimize")
+
+    async def _optimize_loop(self):
+        while True:
+            await asyncio.sleep(OPTIMIZE_INTERVAL)
+            try:
+                await self.optimize()
+            except Exception as e:
+                logger.warning(f"PRAGMA optimize failed: {e}")
+
+    async def close(self):
+        if self._optimizer is not None:
+            self._optimizer.cancel()
+            try:
+                await self._optimizer
+            except asyncio.CancelledError:
+                pass
+            self._optimizer = None
+        for db in self._all_readers:
+            await db.close()
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            # Recommended just before closing a long-lived connection
+            try:
+                await self.optimize()
+            except Exception as e:
+                logger.warning(f"PRAGMA optimize failed: {e}")
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self):
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            # Don't hand the next caller a connection still inside a read
+            # transaction; its open snapshot would also hold back checkpoints
+            try:
+                if db.in_transaction:
+                    await db.rollback()
+            finally:
+                self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        async with self._write_lock:
+            try:
+                yield self._writer
+            finally:
+                # Uncommitted work is discarded, same as closing a per-request
+                # connection; it must not leak into the next writer's commit.
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import time
 from typing import Optional
@@ -10,6 +11,8 @@ router = APIRouter(prefix="/api/files", tags=["files"])
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_READ_SIZE = 1 * 1024 * 1024  # 1MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+BINARY_SNIFF_SIZE = 512
 
 
 @router.post("/upload")
@@ -21,17 +24,29 @@ async def upload_file(file: UploadFile = File(...), username: str = Depends(veri
     except OSError:
         pass
 
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large (max 10MB)")
-
     timestamp = int(time.time())
     safe_name = file.filename.replace("/", "_").replace("\\", "_")
     filename = f"{timestamp}_{safe_name}"
     filepath = os.path.join(settings.UPLOAD_PATH, filename)
 
-    with open(filepath, "wb") as f:
-        f.write(content)
+    # Copy in chunks so only one chunk is held in memory at a time
+    size = 0
+    try:
+        with open(filepath, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    break
+                await asyncio.to_thread(f.write, chunk)
+        if size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="File too large (max 10MB)")
+    except BaseException:
+        # Too large, client gone, disk full...: don't leave a partial file behind
+        try:
+            await asyncio.to_thread(os.unlink, filepath)
+        except OSError:
+            pass
+        raise
 
     # Make file readable by claude user (uid 1000) since FastAPI runs as root
     try:
@@ -42,11 +57,25 @@ async def upload_file(file: UploadFile = File(...), username: str = Depends(veri
     return {
         "filename": filename,
         "path": filepath,
-        "size": len(content),
+        "size": size,
         "content_type": file.content_type,
     }
 
 
+def _write_text(path: str, content: str):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _read_text(path: str) -> str | None:
+    """Return the file's text, or None if its first bytes contain a NUL."""
+    with open(path, "rb") as f:
+        if b"\x00" in f.read(BINARY_SNIFF_SIZE):
+            return None
+    with open(path, "r", errors="replace") as f:
+        return f.read()
+
+
 class FileWrite(BaseModel):
     path: str
     content: str
@@ -64,8 +93,8 @@ async def write_file(body: FileWrite, username: str = Depends(verify_token)):
     os.makedirs(os.path.dirname(expanded), exist_ok=True)
 
     try:
-        with open(expanded, "w") as f:
-            f.write(body.content)
+        # Disk I/O runs in a worker thread so it doesn't stall the event loop
+        await asyncio.to_thread(_write_text, expanded, body.content)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to write file: {str(e)}")
 
@@ -91,13 +120,13 @@ async def list_files(path: str = "", username: str = Depends(verify_token)):
     return entries
 
 
-TEXT_EXTENSIONS = {
+TEXT_EXTENSIONS = frozenset({
     ".txt", ".md", ".py", ".js", ".ts", ".tsx", ".jsx", ".json", ".yaml", ".yml",
     ".toml", ".cfg", ".ini", ".conf", ".sh", ".bash", ".zsh", ".css", ".scss",
     ".html", ".xml", ".svg", ".sql", ".env", ".gitignore", ".dockerfile",
     ".rs", ".go", ".java", ".c", ".cpp", ".h", ".hpp", ".rb", ".php", ".vue",
     ".log", ".csv", ".makefile", ".lock", ".editorconfig",
-}
+})
 
 
 @router.get("/read")
@@ -107,20 +136,20 @@ async def read_file(path: str = Query(...), username: str = Depends(verify_token
     if not os.path.isfile(expanded):
         raise HTTPException(status_code=404, detail="File not found")
 
+    ext = os.path.splitext(expanded)[1].lower()
+    if ext and ext not in TEXT_EXTENSIONS:
+        raise HTTPException(status_code=415, detail="Unsupported file type")
+
     size = os.path.getsize(expanded)
     if size > MAX_READ_SIZE:
         raise HTTPException(status_code=413, detail="File too large (max 1MB)")
 
-    ext = os.path.splitext(expanded)[1].lower()
-    if ext and ext not in TEXT_EXTENSIONS:
-        # Try to read anyway but detect binary
-        pass
-
     try:
-        with open(expanded, "r", errors="replace") as f:
-            content = f.read()
+        content = await asyncio.to_thread(_read_text, expanded)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+    if content is None:
+        raise HTTPException(status_code=415, detail="Binary file")
 
     return {
         "path": expanded,
@@ -130,36 +159,43 @@ async def read_file(path: str = Query(...), username: str = Depends(verify_token
     }
 
 
-def _build_tree(dir_path: str, current_depth: int, max_depth: int) -> list:
-    """Recursively build a directory tree."""
-    if current_depth > max_depth:
-        return []
+# Skip heavy/irrelevant dirs but show dotfiles like .claude
+SKIP_DIRS = frozenset({"node_modules", "__pycache__", ".git", ".npm", ".cache"})
 
-    entries = []
-    try:
-        items = sorted(os.listdir(dir_path))
-    except PermissionError:
-        return []
-
-    # Skip heavy/irrelevant dirs but show dotfiles like .claude
-    SKIP_DIRS = {"node_modules", "__pycache__", ".git", ".npm", ".cache"}
-    for name in items:
-        if name in SKIP_DIRS:
+
+def _build_tree(dir_path: str, current_depth: int, max_depth: int) -> list:
+    """Build a directory tree, walking directories with an explicit stack."""
+    tree = []
+    # (directory, its depth, list that receives its entries)
+    stack = [(dir_path, current_depth, tree)]
+    while stack:
+        path, depth, entries = stack.pop()
+        if depth > max_depth:
+            continue
+        try:
+            # DirEntry caches the d_type from readdir, so is_dir() needs no stat
+            with os.scandir(path) as it:
+                items = sorted(it, key=lambda e: e.name)
+        except PermissionError:
             continue
-        full_path = os.path.join(dir_path, name)
-        is_dir = os.path.isdir(full_path)
-        entry = {
-            "name": name,
-            "path": full_path,
-            "is_dir": is_dir,
-        }
-        if is_dir:
-            entry["children"] = _build_tree(full_path, current_depth + 1, max_depth)
-        else:
-            entry["size"] = os.path.getsize(full_path)
-        entries.append(entry)
 
-    return entries
+        for item in items:
+            if item.name in SKIP_DIRS:
+                continue
+            is_dir = item.is_dir()
+            entry = {
+                "name": item.name,
+                "path": item.path,
+                "is_dir": is_dir,
+            }
+            if is_dir:
+                entry["children"] = []
+                stack.append((item.path, depth + 1, entry["children"]))
+            else:
+                entry["size"] = item.stat().st_size
+            entries.append(entry)
+
+    return tree
 
 
 @router.get("/tree")
@@ -3,8 +3,9 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from config import settings
-from database import init_db
+from database import init_db, db_pool
 from auth.router import router as auth_router
 from sessions.router import router as sessions_router
 from files.router import router as files_router
@@ -13,7 +14,7 @@ from terminal.router import router as terminal_router
 from projects.router import router as projects_router
 from presets.router import router as presets_router
 from scheduler.router import router as scheduler_router
-from scheduler.router import init_scheduler_db
+from scheduler.router import init_scheduler_db, stop_scheduler
 from monitor.router import router as monitor_router
 from monitor.router import init_monitor_db
 from search.router import router as search_router
@@ -30,6 +31,8 @@ logging.basicConfig(level=logging.INFO)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await db_pool.open()
+    app.state.db_pool = db_pool
     await init_db()
     await init_scheduler_db()
     await init_monitor_db()
@@ -46,9 +49,16 @@ async def lifespan(app: FastAPI):
         await bot_task
     except asyncio.CancelledError:
         pass
+    await stop_scheduler()
+    await db_pool.close()
 
 
-app = FastAPI(title="Claude Code Dashboard", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="Claude Code Dashboard",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # CORS
 origins = settings.ALLOWED_ORIGINS.split(",") if settings.ALLOWED_ORIGINS != "*" else ["*"]
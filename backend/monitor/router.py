@@ -1,18 +1,49 @@
+import asyncio
 import os
 import re
 import uuid
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import aiosqlite
 from auth.jwt import verify_token
-from database import DB_PATH
+from database import db_pool
 
 router = APIRouter(prefix="/api/monitors", tags=["monitors"])
 
+# Under IGNORECASE i, k and s also match non-ASCII letters (dotless i, Kelvin
+# sign, long s) that an ASCII-only bytes.lower() leaves alone; line breaks would
+# make the literal span lines. None of these can be part of the prefilter.
+_PREFILTER_UNSAFE = frozenset("iks\r\n")
+
+
+def _required_literal(pattern: str) -> str:
+    """Longest top-level literal run that every match must contain, lowercased.
+
+    Returns "" when there is none; alternation, groups and repeats all parse to
+    non-LITERAL nodes, so only unconditional characters are collected.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return ""
+    best = run = ""
+    for op, arg in parsed:
+        ch = chr(arg) if op is sre_parse.LITERAL else ""
+        if ch.isascii() and ch and ch.lower() not in _PREFILTER_UNSAFE:
+            run += ch.lower()
+            if len(run) > len(best):
+                best = run
+        else:
+            run = ""
+    return best
+
 
 async def init_monitor_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS monitors (
                 id TEXT PRIMARY KEY,
@@ -36,9 +67,91 @@ async def init_monitor_db():
                 FOREIGN KEY (monitor_id) REFERENCES monitors(id) ON DELETE CASCADE
             )
         """)
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alerts_monitor_created ON monitor_alerts(monitor_id, created_at DESC)"
+        )
         await db.commit()
 
 
+TAIL_LINES = 200
+
+# monitor_id -> (pattern, compiled, required literal); rebuilt when the pattern changes
+_pat_cache: dict[str, tuple[str, re.Pattern, str]] = {}
+
+
+def _compiled_pattern(monitor_id: str, pattern: str) -> tuple[re.Pattern, str]:
+    """Compiled IGNORECASE pattern and prefilter literal, cached per monitor. Raises re.error."""
+    cached = _pat_cache.get(monitor_id)
+    if cached is None or cached[0] != pattern:
+        cached = (pattern, re.compile(pattern, re.IGNORECASE), _required_literal(pattern))
+        _pat_cache[monitor_id] = cached
+    return cached[1], cached[2]
+
+
+def _tail_bytes(path: str, count: int = TAIL_LINES) -> bytes:
+    """Return the raw bytes of the last `count` lines of a file, reading backwards from the end."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        chunk = 8192
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            data = f.read(size - start)
+            # More than `count` newlines means the first kept line is complete
+            if start == 0 or data.count(b"\n") > count:
+                break
+            chunk *= 8
+    kept = data.splitlines(keepends=True)[-count:]
+    return data[len(data) - sum(map(len, kept)):]
+
+
+def _line_bounds(buf: bytes, pos: int, end: int) -> tuple[int, int]:
+    """Start and end (past the terminator) of the line holding buf[pos:end].
+
+    Lines end at \n, \r or \r\n, the same breaks bytes.splitlines() uses.
+    """
+    start = max(buf.rfind(b"\n", 0, pos), buf.rfind(b"\r", 0, pos)) + 1
+    breaks = [i for i in (buf.find(b"\n", end), buf.find(b"\r", end)) if i != -1]
+    if not breaks:
+        return start, len(buf)
+    stop = min(breaks)
+    return start, stop + (2 if buf[stop:stop + 2] == b"\r\n" else 1)
+
+
+def _decode_line(raw: bytes) -> str:
+    """Decode one line, normalizing its terminator to \n like text-mode reads do."""
+    if raw.endswith(b"\r\n"):
+        raw = raw[:-2] + b"\n"
+    elif raw.endswith(b"\r"):
+        raw = raw[:-1] + b"\n"
+    return raw.decode("utf-8", errors="replace")
+
+
+def _scan_log(path: str, compiled: re.Pattern, literal: str) -> list[str]:
+    """Return the stripped tail lines of a log that match the pattern."""
+    tail = _tail_bytes(path)
+    matches = []
+    if not literal:
+        for raw in tail.splitlines(keepends=True):
+            line = _decode_line(raw)
+            if compiled.search(line):
+                matches.append(line.strip())
+        return matches
+
+    # Find the literal in one pass over the buffer and only decode and regex
+    # the lines it lands in. bytes.lower() folds ASCII only, so offsets stay put.
+    lowered = tail.lower()
+    needle = literal.encode()
+    pos = lowered.find(needle)
+    while pos != -1:
+        start, end = _line_bounds(tail, pos, pos + len(needle))
+        line = _decode_line(tail[start:end])
+        if compiled.search(line):
+            matches.append(line.strip())
+        pos = lowered.find(needle, end)
+    return matches
+
+
 class MonitorCreate(BaseModel):
     name: str
     log_path: str
@@ -48,18 +161,17 @@ class MonitorCreate(BaseModel):
 
 @router.get("")
 async def list_monitors(username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute("SELECT * FROM monitors ORDER BY created_at DESC")
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    return [dict(row) for row in rows]
 
 
 @router.post("")
 async def add_monitor(body: MonitorCreate, username: str = Depends(verify_token)):
     monitor_id = str(uuid.uuid4())[:8]
     now = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute(
             "INSERT INTO monitors (id, name, log_path, pattern, enabled, auto_fix, created_at) VALUES (?, ?, ?, ?, 1, ?, ?)",
             (monitor_id, body.name, body.log_path, body.pattern, body.auto_fix, now),
@@ -74,46 +186,43 @@ async def add_monitor(body: MonitorCreate, username: str = Depends(verify_token)
 
 @router.delete("/{monitor_id}")
 async def delete_monitor(monitor_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("DELETE FROM monitor_alerts WHERE monitor_id = ?", (monitor_id,))
         cursor = await db.execute("DELETE FROM monitors WHERE id = ?", (monitor_id,))
         await db.commit()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Monitor not found")
+    _pat_cache.pop(monitor_id, None)
     return {"detail": "Deleted"}
 
 
 @router.post("/{monitor_id}/toggle")
 async def toggle_monitor(monitor_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM monitors WHERE id = ?", (monitor_id,))
+    async with db_pool.writer() as db:
+        cursor = await db.execute(
+            "UPDATE monitors SET enabled = NOT enabled WHERE id = ? RETURNING enabled", (monitor_id,)
+        )
         monitor = await cursor.fetchone()
-        if not monitor:
-            raise HTTPException(status_code=404, detail="Monitor not found")
-
-        new_enabled = not monitor["enabled"]
-        await db.execute("UPDATE monitors SET enabled = ? WHERE id = ?", (new_enabled, monitor_id))
         await db.commit()
-    return {"id": monitor_id, "enabled": new_enabled}
+    if not monitor:
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    return {"id": monitor_id, "enabled": bool(monitor["enabled"])}
 
 
 @router.get("/{monitor_id}/alerts")
 async def get_alerts(monitor_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute(
             "SELECT * FROM monitor_alerts WHERE monitor_id = ? ORDER BY created_at DESC LIMIT 100",
             (monitor_id,),
         )
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    return [dict(row) for row in rows]
 
 
 @router.post("/{monitor_id}/check")
 async def check_monitor(monitor_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute("SELECT * FROM monitors WHERE id = ?", (monitor_id,))
         monitor = await cursor.fetchone()
         if not monitor:
@@ -123,38 +232,29 @@ async def check_monitor(monitor_id: str, username: str = Depends(verify_token)):
     if not os.path.isfile(log_path):
         raise HTTPException(status_code=400, detail=f"Log file not found: {log_path}")
 
-    # Read last 200 lines
-    try:
-        with open(log_path, "r", errors="replace") as f:
-            lines = f.readlines()
-        last_lines = lines[-200:] if len(lines) > 200 else lines
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read log file: {str(e)}")
-
     pattern = monitor["pattern"]
     now = datetime.now(timezone.utc).isoformat()
-    matches = []
 
     try:
-        re.compile(pattern)
+        compiled, literal = _compiled_pattern(monitor_id, pattern)
     except re.error as e:
         raise HTTPException(status_code=400, detail=f"Invalid regex pattern: {str(e)}")
 
-    for line in last_lines:
-        if re.search(pattern, line, re.IGNORECASE):
-            matches.append(line.strip())
+    # Read and scan in a worker thread so a large log doesn't block the loop
+    try:
+        matches = await asyncio.to_thread(_scan_log, log_path, compiled, literal)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read log file: {str(e)}")
 
-    alerts_created = []
-    async with aiosqlite.connect(DB_PATH) as db:
+    alerts_created = [{"content": match, "created_at": now} for match in matches]
+    async with db_pool.writer() as db:
+        # One transaction for the last_check bump and all alerts
+        await db.execute("BEGIN IMMEDIATE")
         await db.execute("UPDATE monitors SET last_check = ? WHERE id = ?", (now, monitor_id))
-
-        for match in matches:
-            await db.execute(
-                "INSERT INTO monitor_alerts (monitor_id, content, created_at) VALUES (?, ?, ?)",
-                (monitor_id, match, now),
-            )
-            alerts_created.append({"content": match, "created_at": now})
-
+        await db.executemany(
+            "INSERT INTO monitor_alerts (monitor_id, content, created_at) VALUES (?, ?, ?)",
+            [(monitor_id, match, now) for match in matches],
+        )
         await db.commit()
 
     return {
@@ -1,5 +1,6 @@
 import os
-import json
+import copy
+import orjson
 import uuid
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
@@ -28,20 +29,44 @@ class PresetUpdate(BaseModel):
     prompt: str | None = None
 
 
+# Parsed presets.json, reused until the file's (mtime, size) changes
+_cache: dict = {"key": None, "data": None}
+
+
 def _read_presets() -> list:
-    if not os.path.exists(PRESETS_FILE):
-        os.makedirs(os.path.dirname(PRESETS_FILE), exist_ok=True)
-        with open(PRESETS_FILE, "w") as f:
-            json.dump(DEFAULT_PRESETS, f, indent=2, ensure_ascii=False)
-        return DEFAULT_PRESETS.copy()
-    with open(PRESETS_FILE, "r") as f:
-        return json.load(f)
+    try:
+        st = os.stat(PRESETS_FILE)
+    except FileNotFoundError:
+        presets = copy.deepcopy(DEFAULT_PRESETS)
+        _write_presets(presets)
+        return presets
+    key = (st.st_mtime_ns, st.st_size)
+    if _cache["key"] != key:
+        with open(PRESETS_FILE, "rb") as f:
+            _cache["data"] = orjson.loads(f.read())
+        _cache["key"] = key
+    return _cache["data"]
 
 
 def _write_presets(presets: list):
     os.makedirs(os.path.dirname(PRESETS_FILE), exist_ok=True)
-    with open(PRESETS_FILE, "w") as f:
-        json.dump(presets, f, indent=2, ensure_ascii=False)
+    # Write a temp file and rename it over the original so a crash mid-write
+    # never leaves a truncated file behind
+    tmp = PRESETS_FILE + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(presets, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, PRESETS_FILE)
+    except BaseException:
+        # Callers edit the cached object in place before writing; drop it so
+        # the next read reloads what is actually on disk
+        _cache["key"] = None
+        raise
+    st = os.stat(PRESETS_FILE)
+    _cache["key"] = (st.st_mtime_ns, st.st_size)
+    _cache["data"] = presets
 
 
 @router.get("")
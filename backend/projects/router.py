@@ -1,5 +1,6 @@
 import os
-import json
+import copy
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from auth.jwt import verify_token
@@ -22,20 +23,66 @@ class ProjectUpdate(BaseModel):
     active: bool | None = None
 
 
+# Parsed projects.json, reused until the file's (mtime, size) changes, plus a
+# name -> project index over data["projects"]
+_cache: dict = {"key": None, "data": None, "by_name": {}}
+
+
+def _index(data: dict) -> dict:
+    by_name = {}
+    for p in data["projects"]:
+        # First entry wins, matching a front-to-back scan
+        by_name.setdefault(p["name"], p)
+    return by_name
+
+
+def _projects_by_name() -> dict:
+    """Name -> project for the data last returned by _read_projects."""
+    return _cache["by_name"]
+
+
+def load_projects() -> dict | None:
+    """Parsed projects.json, or None if it doesn't exist. Safe to call from a worker thread."""
+    try:
+        st = os.stat(PROJECTS_FILE)
+    except FileNotFoundError:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    if _cache["key"] == key:
+        return _cache["data"]
+    with open(PROJECTS_FILE, "rb") as f:
+        data = orjson.loads(f.read())
+    # Publish key, data and index together so concurrent readers never mix versions
+    _cache.update(key=key, data=data, by_name=_index(data))
+    return data
+
+
 def _read_projects() -> dict:
-    if not os.path.exists(PROJECTS_FILE):
-        os.makedirs(os.path.dirname(PROJECTS_FILE), exist_ok=True)
-        with open(PROJECTS_FILE, "w") as f:
-            json.dump(DEFAULT_DATA, f, indent=2)
-        return DEFAULT_DATA.copy()
-    with open(PROJECTS_FILE, "r") as f:
-        return json.load(f)
+    data = load_projects()
+    if data is None:
+        data = copy.deepcopy(DEFAULT_DATA)
+        _write_projects(data)
+    return data
 
 
 def _write_projects(data: dict):
     os.makedirs(os.path.dirname(PROJECTS_FILE), exist_ok=True)
-    with open(PROJECTS_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Write a temp file and rename it over the original so a crash mid-write
+    # never leaves a truncated file behind
+    tmp = PROJECTS_FILE + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, PROJECTS_FILE)
+    except BaseException:
+        # Callers edit the cached object in place before writing; drop it so
+        # the next read reloads what is actually on disk
+        _cache["key"] = None
+        raise
+    st = os.stat(PROJECTS_FILE)
+    _cache.update(key=(st.st_mtime_ns, st.st_size), data=data, by_name=_index(data))
 
 
 @router.get("")
@@ -47,9 +94,8 @@ async def list_projects(username: str = Depends(verify_token)):
 @router.post("")
 async def add_project(body: ProjectCreate, username: str = Depends(verify_token)):
     data = _read_projects()
-    for p in data["projects"]:
-        if p["name"] == body.name:
-            raise HTTPException(status_code=400, detail="Project with this name already exists")
+    if body.name in _projects_by_name():
+        raise HTTPException(status_code=400, detail="Project with this name already exists")
     project = {"name": body.name, "path": body.path, "active": False}
     data["projects"].append(project)
     _write_projects(data)
@@ -59,18 +105,17 @@ async def add_project(body: ProjectCreate, username: str = Depends(verify_token)
 @router.put("/{name}")
 async def update_project(name: str, body: ProjectUpdate, username: str = Depends(verify_token)):
     data = _read_projects()
-    for i, p in enumerate(data["projects"]):
-        if p["name"] == name:
-            if body.name is not None:
-                p["name"] = body.name
-            if body.path is not None:
-                p["path"] = body.path
-            if body.active is not None:
-                p["active"] = body.active
-            data["projects"][i] = p
-            _write_projects(data)
-            return p
-    raise HTTPException(status_code=404, detail="Project not found")
+    p = _projects_by_name().get(name)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if body.name is not None:
+        p["name"] = body.name
+    if body.path is not None:
+        p["path"] = body.path
+    if body.active is not None:
+        p["active"] = body.active
+    _write_projects(data)
+    return p
 
 
 @router.delete("/{name}")
@@ -89,15 +134,11 @@ async def delete_project(name: str, username: str = Depends(verify_token)):
 @router.post("/{name}/activate")
 async def activate_project(name: str, username: str = Depends(verify_token)):
     data = _read_projects()
-    found = False
-    for p in data["projects"]:
-        if p["name"] == name:
-            p["active"] = True
-            found = True
-        else:
-            p["active"] = False
-    if not found:
+    # Check before mutating: data is the cached copy shared by later reads
+    if name not in _projects_by_name():
         raise HTTPException(status_code=404, detail="Project not found")
+    for p in data["projects"]:
+        p["active"] = p["name"] == name
     data["active"] = name
     _write_projects(data)
     return {"active": name}
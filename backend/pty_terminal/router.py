@@ -3,6 +3,7 @@ import fcntl
 import json
 import os
 import pty
+import shutil
 import signal
 import struct
 import termios
@@ -11,6 +12,12 @@ from auth.jwt import verify_token_from_string
 
 router = APIRouter(tags=["pty_terminal"])
 
+# Resolved once; spawning a PTY no longer walks $PATH
+CLAUDE_PATH = shutil.which("claude")
+
+PTY_READ_SIZE = 65536
+PTY_QUEUE_SIZE = 64
+
 
 def _set_winsize(fd: int, rows: int, cols: int):
     """Set the terminal window size on a PTY file descriptor."""
@@ -18,6 +25,59 @@ def _set_winsize(fd: int, rows: int, cols: int):
     fcntl.ioctl(fd, termios.TIOCSWINSZ, winsize)
 
 
+async def _wait_exit(pid: int, timeout: float) -> bool:
+    """Wait up to `timeout` seconds for a child to exit, without reaping it."""
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    if pidfd is None:
+        # No pidfd (non-Linux or old kernel): poll instead
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            try:
+                if os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+                    return True
+            except ChildProcessError:
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    # A pidfd becomes readable once the process exits
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await asyncio.wait_for(exited, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
+
+async def _terminate_child(pid: int, timeout: float = 0.5):
+    """SIGHUP the child, SIGKILL it if still alive after `timeout`, then reap it."""
+    try:
+        os.kill(pid, signal.SIGHUP)
+    except ProcessLookupError:
+        pass
+
+    if not await _wait_exit(pid, timeout):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    # Reap zombie process; after SIGKILL this can take a moment, so off the loop
+    try:
+        await asyncio.to_thread(os.waitpid, pid, 0)
+    except ChildProcessError:
+        pass
+
+
 @router.websocket("/api/pty/ws")
 async def pty_websocket(websocket: WebSocket, token: str = ""):
     """Full PTY terminal over WebSocket.
@@ -49,10 +109,8 @@ async def pty_websocket(websocket: WebSocket, token: str = ""):
     # Determine which user to run as
     # If running as root inside Docker, switch to 'claude' user
     # Start Claude Code CLI; fall back to bash if not available
-    import shutil
-    claude_path = shutil.which("claude")
-    if claude_path:
-        shell_cmd = [claude_path, "--dangerously-skip-permissions"]
+    if CLAUDE_PATH:
+        shell_cmd = [CLAUDE_PATH, "--dangerously-skip-permissions"]
     else:
         shell_cmd = ["/bin/bash", "--login"]
     pid = os.fork()
@@ -92,31 +150,47 @@ async def pty_websocket(websocket: WebSocket, token: str = ""):
         # Parent process
         os.close(slave_fd)
 
-        loop = asyncio.get_event_loop()
-        read_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Output chunks waiting to be sent; None marks EOF
+        output: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=PTY_QUEUE_SIZE)
+        reading = True
+
+        def _pause_reading():
+            nonlocal reading
+            loop.remove_reader(master_fd)
+            reading = False
 
-        # Register master_fd for reading via event loop
+        # Read straight from the event loop callback into the queue
         def _on_readable():
-            read_event.set()
+            try:
+                data = os.read(master_fd, PTY_READ_SIZE)
+            except OSError:
+                data = b""
+            if not data:
+                # Unregister for good; `reading` stays set so it isn't re-added
+                loop.remove_reader(master_fd)
+                output.put_nowait(None)
+                return
+            output.put_nowait(data)
+            # Backpressure: stop reading while the websocket catches up; the
+            # queue is never full while the reader is registered
+            if output.full():
+                _pause_reading()
 
         loop.add_reader(master_fd, _on_readable)
 
         async def read_pty():
-            """Read from PTY and forward to WebSocket in small chunks."""
-            CHUNK = 1024  # smaller chunks for smoother mobile rendering
+            """Forward queued PTY output to the WebSocket."""
+            nonlocal reading
             try:
                 while True:
-                    read_event.clear()
-                    await read_event.wait()
-                    try:
-                        data = os.read(master_fd, 4096)
-                        if not data:
-                            break
-                        # Send in small chunks so the browser can render progressively
-                        for i in range(0, len(data), CHUNK):
-                            await websocket.send_bytes(data[i:i + CHUNK])
-                    except OSError:
+                    data = await output.get()
+                    if data is None:
                         break
+                    if not reading and not output.full():
+                        loop.add_reader(master_fd, _on_readable)
+                        reading = True
+                    await websocket.send_bytes(data)
             except Exception:
                 pass
 
@@ -175,20 +249,4 @@ async def pty_websocket(websocket: WebSocket, token: str = ""):
                 pass
 
             # Terminate the shell process
-            try:
-                os.kill(pid, signal.SIGHUP)
-            except ProcessLookupError:
-                pass
-
-            # Wait briefly, then force kill
-            await asyncio.sleep(0.5)
-            try:
-                os.kill(pid, signal.SIGKILL)
-            except ProcessLookupError:
-                pass
-
-            # Reap zombie process
-            try:
-                os.waitpid(pid, os.WNOHANG)
-            except ChildProcessError:
-                pass
+            await _terminate_child(pid)
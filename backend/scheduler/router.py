@@ -1,25 +1,52 @@
 import os
 import pwd
+import shutil
 import uuid
 import asyncio
 import logging
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import aiosqlite
 from croniter import croniter
 from auth.jwt import verify_token
-from database import DB_PATH
+from database import db_pool
 
 logger = logging.getLogger("scheduler")
 router = APIRouter(prefix="/api/scheduler", tags=["scheduler"])
 
+# Absolute path so each run skips the $PATH search; the bare name keeps the
+# "command not found" error if the CLI isn't installed
+CLAUDE_PATH = shutil.which("claude") or "claude"
+
 # Background task handle
 _scheduler_task: asyncio.Task | None = None
 
+# Runs go through a bounded queue drained by a few workers, so neither the cron
+# loop nor the API spawns claude processes without limit
+WORKER_COUNT = min(os.cpu_count() or 1, 4)
+QUEUE_SIZE = 100
+_run_queue: asyncio.Queue[tuple[str, str, bool, asyncio.Future | None]] = asyncio.Queue(maxsize=QUEUE_SIZE)
+_workers: list[asyncio.Task] = []
+
+
+def _parse_utc(value: str) -> datetime:
+    """Parse a stored ISO timestamp, treating naive values as UTC."""
+    # Handle both formats
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _next_fire_ts(cron: str, base: datetime) -> int:
+    """Unix time of the first cron fire strictly after `base`."""
+    return int(croniter(cron, base).get_next(float))
+
 
 async def init_scheduler_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS scheduled_tasks (
                 id TEXT PRIMARY KEY,
@@ -29,9 +56,27 @@ async def init_scheduler_db():
                 enabled BOOLEAN DEFAULT 1,
                 last_run TEXT,
                 last_result TEXT,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                next_fire_ts INTEGER
             )
         """)
+        # Migrate older databases: add next_fire_ts and fill it in from each
+        # task's last run (or creation), so missed runs still fire once
+        cursor = await db.execute("PRAGMA table_info(scheduled_tasks)")
+        columns = {row["name"] for row in await cursor.fetchall()}
+        if "next_fire_ts" not in columns:
+            await db.execute("ALTER TABLE scheduled_tasks ADD COLUMN next_fire_ts INTEGER")
+            cursor = await db.execute("SELECT id, cron, last_run, created_at FROM scheduled_tasks")
+            backfill = []
+            for task in await cursor.fetchall():
+                try:
+                    base = _parse_utc(task["last_run"] or task["created_at"])
+                    backfill.append((_next_fire_ts(task["cron"], base), task["id"]))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Invalid cron for task {task['id']}: {e}")
+            await db.executemany("UPDATE scheduled_tasks SET next_fire_ts = ? WHERE id = ?", backfill)
+        await db.execute("DROP INDEX IF EXISTS idx_tasks_enabled")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON scheduled_tasks(enabled, next_fire_ts)")
         await db.commit()
 
     # Start background scheduler
@@ -39,12 +84,38 @@ async def init_scheduler_db():
     if _scheduler_task is None or _scheduler_task.done():
         _scheduler_task = asyncio.create_task(_scheduler_loop())
         logger.info("Scheduler background loop started")
+    if not _workers:
+        _workers.extend(asyncio.create_task(_run_worker()) for _ in range(WORKER_COUNT))
+
+
+async def stop_scheduler():
+    """Cancel the loop and workers; must run before the DB pool is closed."""
+    global _scheduler_task
+    tasks = _workers[:]
+    if _scheduler_task is not None:
+        tasks.append(_scheduler_task)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _scheduler_task = None
+    _workers.clear()
 
 
 # --------------- Background cron loop ---------------
 
-async def _execute_task(task_id: str, prompt: str):
-    """Run a Claude Code prompt and save result to DB."""
+async def _drain(stream: asyncio.StreamReader) -> bytes:
+    """Read a subprocess pipe to EOF in fixed-size chunks."""
+    chunks = []
+    while chunk := await stream.read(65536):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _execute_task(task_id: str, prompt: str, mark_started: bool = True):
+    """Run a Claude Code prompt, save the result to DB and return the updated row.
+
+    Cron runs pass mark_started=False: the scheduler tick already set last_run.
+    """
     now = datetime.now(timezone.utc).isoformat()
 
     def _demote():
@@ -61,14 +132,17 @@ async def _execute_task(task_id: str, prompt: str):
 
     try:
         proc = await asyncio.create_subprocess_exec(
-            "claude", "-p", prompt, "--dangerously-skip-permissions",
+            CLAUDE_PATH, "-p", prompt, "--dangerously-skip-permissions",
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
             preexec_fn=_demote,
             env=env,
         )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=120)
-        result = stdout.decode() if stdout else stderr.decode()
+        # Drain both pipes concurrently so neither can fill up and stall the child
+        stdout, stderr, _ = await asyncio.wait_for(
+            asyncio.gather(_drain(proc.stdout), _drain(proc.stderr), proc.wait()), timeout=120
+        )
+        result = (stdout or stderr).decode("utf-8", errors="replace")
     except asyncio.TimeoutError:
         proc.terminate()
         try:
@@ -81,14 +155,44 @@ async def _execute_task(task_id: str, prompt: str):
     except Exception as e:
         result = f"Error: {str(e)}"
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE scheduled_tasks SET last_run = ?, last_result = ? WHERE id = ?",
-            (now, result, task_id),
-        )
+    async with db_pool.writer() as db:
+        if mark_started:
+            cursor = await db.execute(
+                "UPDATE scheduled_tasks SET last_run = ?, last_result = ? WHERE id = ? RETURNING *",
+                (now, result, task_id),
+            )
+        else:
+            cursor = await db.execute(
+                "UPDATE scheduled_tasks SET last_result = ? WHERE id = ? RETURNING *", (result, task_id)
+            )
+        updated = await cursor.fetchone()
         await db.commit()
 
     logger.info(f"Scheduled task '{task_id}' executed, result length: {len(result)}")
+    return updated
+
+
+async def _run_worker():
+    """Execute queued runs one at a time, resolving the caller's future if any."""
+    while True:
+        task_id, prompt, mark_started, result = await _run_queue.get()
+        try:
+            updated = await _execute_task(task_id, prompt, mark_started)
+            if result is not None and not result.done():
+                result.set_result(updated)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled task '{task_id}' failed: {e}")
+            if result is not None and not result.done():
+                result.set_exception(e)
+        finally:
+            _run_queue.task_done()
+
+
+def _enqueue_run(task_id: str, prompt: str, mark_started: bool = True, result: asyncio.Future | None = None):
+    """Queue a run; raises asyncio.QueueFull when the backlog is at its cap."""
+    _run_queue.put_nowait((task_id, prompt, mark_started, result))
 
 
 async def _scheduler_loop():
@@ -99,36 +203,40 @@ async def _scheduler_loop():
             await asyncio.sleep(30)
             now = datetime.now(timezone.utc)
 
-            async with aiosqlite.connect(DB_PATH) as db:
-                db.row_factory = aiosqlite.Row
+            # Due tasks come straight off the (enabled, next_fire_ts) index
+            async with db_pool.reader() as db:
                 cursor = await db.execute(
-                    "SELECT * FROM scheduled_tasks WHERE enabled = 1"
+                    "SELECT id, name, cron, prompt FROM scheduled_tasks WHERE enabled = 1 AND next_fire_ts <= ?",
+                    (int(now.timestamp()),),
                 )
                 tasks = await cursor.fetchall()
 
+            # (last_run or None if not queued, next_fire_ts, id) for every task fired this tick
+            fired = []
             for task in tasks:
                 try:
-                    cron = croniter(task["cron"], now)
-                    prev_fire = cron.get_prev(datetime)
-
-                    # Check if last_run is before prev_fire (meaning we missed a run)
-                    last_run = None
-                    if task["last_run"]:
-                        last_run_str = task["last_run"]
-                        # Handle both formats
-                        if last_run_str.endswith("Z"):
-                            last_run_str = last_run_str[:-1] + "+00:00"
-                        last_run = datetime.fromisoformat(last_run_str)
-                        if last_run.tzinfo is None:
-                            last_run = last_run.replace(tzinfo=timezone.utc)
-
-                    if last_run is None or last_run < prev_fire.replace(tzinfo=timezone.utc):
-                        logger.info(f"Cron triggered task '{task['name']}' (id={task['id']})")
-                        # Run in background to not block the loop
-                        asyncio.create_task(_execute_task(task["id"], task["prompt"]))
-
+                    next_ts = _next_fire_ts(task["cron"], now)
                 except (ValueError, KeyError) as e:
                     logger.warning(f"Invalid cron for task {task['id']}: {e}")
+                    continue
+
+                logger.info(f"Cron triggered task '{task['name']}' (id={task['id']})")
+                try:
+                    _enqueue_run(task["id"], task["prompt"], mark_started=False)
+                    fired.append((now.isoformat(), next_ts, task["id"]))
+                except asyncio.QueueFull:
+                    logger.warning(f"Run queue full, skipping task {task['id']} until its next fire")
+                    fired.append((None, next_ts, task["id"]))
+
+            if fired:
+                # One write for the whole tick; next_fire_ts moves on so a long
+                # run isn't re-triggered by the next tick
+                async with db_pool.writer() as db:
+                    await db.executemany(
+                        "UPDATE scheduled_tasks SET last_run = COALESCE(?, last_run), next_fire_ts = ? WHERE id = ?",
+                        fired,
+                    )
+                    await db.commit()
 
         except asyncio.CancelledError:
             break
@@ -154,11 +262,10 @@ class TaskUpdate(BaseModel):
 
 @router.get("/tasks")
 async def list_tasks(username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute("SELECT * FROM scheduled_tasks ORDER BY created_at DESC")
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    return [dict(row) for row in rows]
 
 
 @router.post("/tasks")
@@ -168,11 +275,13 @@ async def create_task(body: TaskCreate, username: str = Depends(verify_token)):
         raise HTTPException(status_code=400, detail="Invalid cron expression")
 
     task_id = str(uuid.uuid4())[:8]
-    now = datetime.now(timezone.utc).isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
+    created = datetime.now(timezone.utc)
+    now = created.isoformat()
+    async with db_pool.writer() as db:
         await db.execute(
-            "INSERT INTO scheduled_tasks (id, name, cron, prompt, enabled, created_at) VALUES (?, ?, ?, ?, 1, ?)",
-            (task_id, body.name, body.cron, body.prompt, now),
+            "INSERT INTO scheduled_tasks (id, name, cron, prompt, enabled, created_at, next_fire_ts) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?)",
+            (task_id, body.name, body.cron, body.prompt, now, _next_fire_ts(body.cron, created)),
         )
         await db.commit()
     return {"id": task_id, "name": body.name, "cron": body.cron, "prompt": body.prompt, "enabled": True, "last_run": None, "last_result": None, "created_at": now}
@@ -183,18 +292,13 @@ async def update_task(task_id: str, body: TaskUpdate, username: str = Depends(ve
     if body.cron is not None and not croniter.is_valid(body.cron):
         raise HTTPException(status_code=400, detail="Invalid cron expression")
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
-        task = await cursor.fetchone()
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-
+    async with db_pool.writer() as db:
         updates = {}
         if body.name is not None:
             updates["name"] = body.name
         if body.cron is not None:
             updates["cron"] = body.cron
+            updates["next_fire_ts"] = _next_fire_ts(body.cron, datetime.now(timezone.utc))
         if body.prompt is not None:
             updates["prompt"] = body.prompt
         if body.enabled is not None:
@@ -203,17 +307,21 @@ async def update_task(task_id: str, body: TaskUpdate, username: str = Depends(ve
         if updates:
             set_clause = ", ".join(f"{k} = ?" for k in updates)
             values = list(updates.values()) + [task_id]
-            await db.execute(f"UPDATE scheduled_tasks SET {set_clause} WHERE id = ?", values)
+            cursor = await db.execute(f"UPDATE scheduled_tasks SET {set_clause} WHERE id = ? RETURNING *", values)
+            task = await cursor.fetchone()
             await db.commit()
+        else:
+            cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
+            task = await cursor.fetchone()
 
-        cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
-        task = await cursor.fetchone()
-        return dict(task)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return dict(task)
 
 
 @router.delete("/tasks/{task_id}")
 async def delete_task(task_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         cursor = await db.execute("DELETE FROM scheduled_tasks WHERE id = ?", (task_id,))
         await db.commit()
         if cursor.rowcount == 0:
@@ -223,33 +331,33 @@ async def delete_task(task_id: str, username: str = Depends(verify_token)):
 
 @router.post("/tasks/{task_id}/run")
 async def run_task(task_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
+    async with db_pool.reader() as db:
+        cursor = await db.execute("SELECT prompt FROM scheduled_tasks WHERE id = ?", (task_id,))
         task = await cursor.fetchone()
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
 
-    await _execute_task(task_id, task["prompt"])
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
-        updated = await cursor.fetchone()
-        return dict(updated)
+    result = asyncio.get_running_loop().create_future()
+    try:
+        _enqueue_run(task_id, task["prompt"], result=result)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Too many queued runs, try again later")
+    updated = await result
+    if not updated:
+        # Deleted while it was running
+        raise HTTPException(status_code=404, detail="Task not found")
+    return dict(updated)
 
 
 @router.post("/tasks/{task_id}/toggle")
 async def toggle_task(task_id: str, username: str = Depends(verify_token)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,))
+    async with db_pool.writer() as db:
+        cursor = await db.execute(
+            "UPDATE scheduled_tasks SET enabled = NOT enabled WHERE id = ? RETURNING enabled", (task_id,)
+        )
         task = await cursor.fetchone()
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-
-        new_enabled = not task["enabled"]
-        await db.execute("UPDATE scheduled_tasks SET enabled = ? WHERE id = ?", (new_enabled, task_id))
         await db.commit()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-    return {"id": task_id, "enabled": new_enabled}
+    return {"id": task_id, "enabled": bool(task["enabled"])}
@@ -1,10 +1,10 @@
+import asyncio
 import os
-import glob
 from fastapi import APIRouter, Depends, HTTPException, Query
-import aiosqlite
 from auth.jwt import verify_token
 from config import settings
-from database import DB_PATH
+from database import db_pool
+from sessions.brain import list_md_files
 
 router = APIRouter(prefix="/api/search", tags=["search"])
 
@@ -22,85 +22,136 @@ async def search(
         results.extend(session_results)
 
     if type in ("brain", "all"):
-        brain_results = _search_brain(q)
+        brain_results = await _search_brain(q)
         results.extend(brain_results)
 
     return {"query": q, "type": type, "total": len(results), "results": results}
 
 
+# Trigram FTS needs at least three characters to probe the index
+FTS_MIN_CHARS = 3
+
+
+def _snippet(content: str, keyword: str) -> str:
+    """~80 characters either side of the first case-insensitive keyword hit."""
+    idx = content.lower().find(keyword.lower())
+    start = max(0, idx - 80)
+    end = min(len(content), idx + len(keyword) + 80)
+    snippet = content[start:end]
+    if start > 0:
+        snippet = "..." + snippet
+    if end < len(content):
+        snippet = snippet + "..."
+    return snippet
+
+
 async def _search_sessions(keyword: str) -> list:
-    results = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """
-            SELECT m.id, m.session_id, m.content, m.timestamp, m.role
-            FROM messages m
-            WHERE m.content LIKE ?
-            ORDER BY m.timestamp DESC
-            LIMIT 50
-            """,
-            (f"%{keyword}%",),
-        )
-        rows = await cursor.fetchall()
-        for row in rows:
-            content = row["content"]
-            # Create a snippet around the keyword
-            lower_content = content.lower()
-            idx = lower_content.find(keyword.lower())
-            start = max(0, idx - 80)
-            end = min(len(content), idx + len(keyword) + 80)
-            snippet = content[start:end]
-            if start > 0:
-                snippet = "..." + snippet
-            if end < len(content):
-                snippet = snippet + "..."
-
-            results.append({
-                "source": "session",
-                "session_id": row["session_id"],
-                "message_id": row["id"],
-                "role": row["role"],
-                "snippet": snippet,
-                "timestamp": row["timestamp"],
-            })
-    return results
-
-
-def _search_brain(keyword: str) -> list:
-    results = []
+    async with db_pool.reader() as db:
+        if len(keyword) >= FTS_MIN_CHARS:
+            # Quoted as one phrase so FTS operators in the query are literal
+            cursor = await db.execute(
+                """
+                SELECT m.id, m.session_id, m.timestamp, m.role,
+                       snippet(messages_fts, 0, '', '', '...', 64) AS snippet
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY m.timestamp DESC
+                LIMIT 50
+                """,
+                ('"' + keyword.replace('"', '""') + '"',),
+            )
+            rows = await cursor.fetchall()
+            snippets = [row["snippet"] for row in rows]
+        else:
+            # Same window as _snippet, cut in SQL so only the snippet leaves SQLite
+            cursor = await db.execute(
+                """
+                SELECT id, session_id, timestamp, role,
+                       max(0, idx - 80) AS start, min(n, idx + :kw_len + 80) AS stop, n,
+                       substr(content, max(0, idx - 80) + 1,
+                              min(n, idx + :kw_len + 80) - max(0, idx - 80)) AS snippet
+                FROM (
+                    SELECT m.id, m.session_id, m.content, m.timestamp, m.role,
+                           length(m.content) AS n, instr(lower(m.content), lower(:kw)) - 1 AS idx
+                    FROM messages m
+                    WHERE m.content LIKE :pattern
+                    ORDER BY m.timestamp DESC
+                    LIMIT 50
+                )
+                ORDER BY timestamp DESC
+                """,
+                {"kw": keyword, "kw_len": len(keyword), "pattern": f"%{keyword}%"},
+            )
+            rows = await cursor.fetchall()
+            snippets = [
+                ("..." if row["start"] > 0 else "") + row["snippet"] + ("..." if row["stop"] < row["n"] else "")
+                for row in rows
+            ]
+
+    return [
+        {
+            "source": "session",
+            "session_id": row["session_id"],
+            "message_id": row["id"],
+            "role": row["role"],
+            "snippet": snippet,
+            "timestamp": row["timestamp"],
+        }
+        for row, snippet in zip(rows, snippets)
+    ]
+
+
+# Enough bytes either side of a hit for 80 whole UTF-8 characters (up to 4 bytes each)
+SNIPPET_BYTES = 80 * 4 + 3
+# str.lower() folds the Kelvin sign to "k" and dotted capital I to "i" plus a
+# combining dot; bytes.lower() leaves both alone, so keywords with these
+# letters can't be matched on raw bytes
+_FOLD_UNSAFE = frozenset("ik")
+
+
+def _decode_text(data: bytes) -> str:
+    """Decode like open(..., "r", errors="replace"), newline translation included."""
+    return data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _scan_brain_file(filepath: str, keyword: str) -> dict | None:
+    try:
+        with open(filepath, "rb") as f:
+            data = f.read()
+    except Exception:
+        return None
+
+    lowered = keyword.lower()
+    if keyword.isascii() and "\n" not in keyword and "\r" not in keyword and _FOLD_UNSAFE.isdisjoint(lowered):
+        # Single-line ASCII keywords can be matched on the raw bytes; only the
+        # window around the first hit is decoded
+        idx = data.lower().find(lowered.encode())
+        if idx == -1:
+            return None
+        content = _decode_text(data[max(0, idx - SNIPPET_BYTES):idx + len(keyword) + SNIPPET_BYTES])
+        snippet = _snippet(content, keyword)
+    else:
+        content = _decode_text(data)
+        if lowered not in content.lower():
+            return None
+        snippet = _snippet(content, keyword)
+
+    return {
+        "source": "brain",
+        "file": os.path.basename(filepath),
+        "path": filepath,
+        "snippet": snippet,
+        "timestamp": None,
+    }
+
+
+async def _search_brain(keyword: str) -> list:
     brain_sessions_dir = os.path.join(settings.CLAUDE_BRAIN_PATH, "sessions")
     if not os.path.isdir(brain_sessions_dir):
-        return results
-
-    md_files = glob.glob(os.path.join(brain_sessions_dir, "*.md"))
-    for filepath in md_files:
-        try:
-            with open(filepath, "r", errors="replace") as f:
-                content = f.read()
-        except Exception:
-            continue
-
-        lower_content = content.lower()
-        if keyword.lower() not in lower_content:
-            continue
-
-        idx = lower_content.find(keyword.lower())
-        start = max(0, idx - 80)
-        end = min(len(content), idx + len(keyword) + 80)
-        snippet = content[start:end]
-        if start > 0:
-            snippet = "..." + snippet
-        if end < len(content):
-            snippet = snippet + "..."
-
-        filename = os.path.basename(filepath)
-        results.append({
-            "source": "brain",
-            "file": filename,
-            "path": filepath,
-            "snippet": snippet,
-            "timestamp": None,
-        })
+        return []
 
-    return results
+    # Files are read in worker threads so the scan neither blocks the loop nor runs one file at a time
+    md_files = list_md_files(brain_sessions_dir)
+    results = await asyncio.gather(*(asyncio.to_thread(_scan_brain_file, fp, keyword) for fp in md_files))
+    return [r for r in results if r is not None]
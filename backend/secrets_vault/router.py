@@ -4,28 +4,34 @@ Fernet 对称加密，密钥从 JWT_SECRET 派生（SHA256 -> base64）
 增删后自动同步到 /home/claude/.env
 """
 
+import asyncio
 import os
+import pwd
+import re
 import uuid
 import hashlib
 import base64
 from datetime import datetime, timezone
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import aiosqlite
 from auth.jwt import verify_token
 from config import settings
-from database import DB_PATH
+from database import db_pool
 
 router = APIRouter(prefix="/api/secrets", tags=["secrets"])
 
 ENV_PATH = "/home/claude/.env"
+# 环境变量名：大写字母开头，只含 A-Z、0-9、_
+_NAME_RE = re.compile(r"^[A-Z][A-Z0-9_]*$")
 
 
 # ── 加密工具 ───────────────────────────────────────
 
+@lru_cache(maxsize=1)
 def _get_fernet() -> Fernet:
-    """从 JWT_SECRET 派生 Fernet 密钥"""
+    """从 JWT_SECRET 派生 Fernet 密钥（JWT_SECRET 运行期不变，只派生一次）"""
     key = hashlib.sha256(settings.JWT_SECRET.encode()).digest()
     return Fernet(base64.urlsafe_b64encode(key))
 
@@ -41,7 +47,7 @@ def _decrypt(token: str) -> str:
 # ── 数据库初始化 ──────────────────────────────────
 
 async def init_secrets_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS secret_vault (
                 id TEXT PRIMARY KEY,
@@ -56,11 +62,29 @@ async def init_secrets_db():
 
 # ── .env 同步 ─────────────────────────────────────
 
+def _write_env(content: str):
+    """原子写入 .env：先写临时文件并设好权限，再 os.replace，避免半截文件"""
+    env_dir = os.path.dirname(ENV_PATH)
+    os.makedirs(env_dir, exist_ok=True)
+    tmp = ENV_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, 0o644)
+    # FastAPI 以 root 运行，需要把文件归属改为 claude 用户
+    try:
+        pw = pwd.getpwnam("claude")
+        os.chown(tmp, pw.pw_uid, pw.pw_gid)
+    except (KeyError, OSError):
+        pass
+    os.replace(tmp, ENV_PATH)
+
+
 async def sync_secrets_to_env():
     """解密所有密钥，写入 /home/claude/.env（export NAME=value 格式）"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
+        async with db_pool.reader() as db:
             cursor = await db.execute("SELECT name, encrypted_value FROM secret_vault ORDER BY name")
             rows = await cursor.fetchall()
 
@@ -71,18 +95,8 @@ async def sync_secrets_to_env():
             escaped = value.replace("\\", "\\\\").replace('"', '\\"')
             lines.append(f'export {row["name"]}="{escaped}"')
 
-        env_dir = os.path.dirname(ENV_PATH)
-        os.makedirs(env_dir, exist_ok=True)
-        with open(ENV_PATH, "w") as f:
-            f.write("\n".join(lines) + "\n" if lines else "")
-        os.chmod(ENV_PATH, 0o644)
-        # FastAPI 以 root 运行，需要把文件归属改为 claude 用户
-        try:
-            import pwd
-            pw = pwd.getpwnam("claude")
-            os.chown(ENV_PATH, pw.pw_uid, pw.pw_gid)
-        except (KeyError, OSError):
-            pass
+        content = "\n".join(lines) + "\n" if lines else ""
+        await asyncio.to_thread(_write_env, content)
     except Exception:
         pass  # 启动时可能还没有表，静默忽略
 
@@ -100,8 +114,7 @@ class SecretCreate(BaseModel):
 @router.get("")
 async def list_secrets(username: str = Depends(verify_token)):
     """列出所有密钥（只返回 name + description，不返回值）"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute(
             "SELECT id, name, description, created_at FROM secret_vault ORDER BY created_at DESC"
         )
@@ -112,8 +125,7 @@ async def list_secrets(username: str = Depends(verify_token)):
 @router.get("/{secret_id}/reveal")
 async def reveal_secret(secret_id: str, username: str = Depends(verify_token)):
     """解密返回单个密钥值"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute(
             "SELECT encrypted_value FROM secret_vault WHERE id = ?", (secret_id,)
         )
@@ -131,8 +143,7 @@ async def create_secret(body: SecretCreate, username: str = Depends(verify_token
     if not name or not body.value:
         raise HTTPException(status_code=400, detail="name and value are required")
 
-    import re
-    if not re.match(r"^[A-Z][A-Z0-9_]*$", name):
+    if not _NAME_RE.match(name):
         raise HTTPException(
             status_code=400,
             detail="Name must start with uppercase letter and contain only A-Z, 0-9, _",
@@ -142,21 +153,18 @@ async def create_secret(body: SecretCreate, username: str = Depends(verify_token
     sid = str(uuid.uuid4())[:8]
     now = datetime.now(timezone.utc).isoformat()
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        # 如果重名则更新
-        existing = await db.execute("SELECT id FROM secret_vault WHERE name = ?", (name,))
-        row = await existing.fetchone()
-        if row:
-            await db.execute(
-                "UPDATE secret_vault SET encrypted_value = ?, description = ? WHERE name = ?",
-                (encrypted, body.description, name),
-            )
-            sid = row[0]
-        else:
-            await db.execute(
-                "INSERT INTO secret_vault (id, name, encrypted_value, description, created_at) VALUES (?, ?, ?, ?, ?)",
-                (sid, name, encrypted, body.description, now),
-            )
+    async with db_pool.writer() as db:
+        # 如果重名则更新，保留原 id
+        cursor = await db.execute(
+            """
+            INSERT INTO secret_vault (id, name, encrypted_value, description, created_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                encrypted_value = excluded.encrypted_value, description = excluded.description
+            RETURNING id
+            """,
+            (sid, name, encrypted, body.description, now),
+        )
+        sid = (await cursor.fetchone())[0]
         await db.commit()
 
     await sync_secrets_to_env()
@@ -167,7 +175,7 @@ async def create_secret(body: SecretCreate, username: str = Depends(verify_token
 @router.delete("/{secret_id}")
 async def delete_secret(secret_id: str, username: str = Depends(verify_token)):
     """删除密钥 + 同步 .env"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_pool.writer() as db:
         cursor = await db.execute("DELETE FROM secret_vault WHERE id = ?", (secret_id,))
         await db.commit()
         if cursor.rowcount == 0:
@@ -1,5 +1,6 @@
+import asyncio
+import heapq
 import os
-import glob
 from datetime import datetime, timezone
 from config import settings
 
@@ -12,6 +13,30 @@ def ensure_brain_dirs():
     os.makedirs(SESSIONS_DIR, exist_ok=True)
 
 
+# Last built context, reused until the set of input files or their (mtime, size) changes
+_context_cache: dict = {"key": None, "text": ""}
+
+
+def list_md_files(directory: str) -> list[str]:
+    """Paths of the visible *.md regular files in directory, in no particular order."""
+    try:
+        with os.scandir(directory) as it:
+            return [
+                e.path for e in it
+                if e.name.endswith(".md") and not e.name.startswith(".") and e.is_file()
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _stat_key(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
 def get_context() -> str:
     """
     Build context string from brain data:
@@ -19,19 +44,24 @@ def get_context() -> str:
     2. Latest 3 session summaries (by filename timestamp)
     """
     ensure_brain_dirs()
+
+    prefs_path = os.path.join(BRAIN_PATH, "preferences.md")
+    # Last 3 .md files sorted by name desc
+    recent = heapq.nlargest(3, list_md_files(SESSIONS_DIR))
+    key = (_stat_key(prefs_path), tuple((fp, _stat_key(fp)) for fp in recent))
+    if _context_cache["key"] == key:
+        return _context_cache["text"]
+
     parts = []
 
     # 1. Preferences
-    prefs_path = os.path.join(BRAIN_PATH, "preferences.md")
-    if os.path.exists(prefs_path):
+    if key[0] is not None:
         with open(prefs_path, "r") as f:
             prefs = f.read().strip()
         if prefs:
             parts.append(f"[你的偏好]\n{prefs}")
 
-    # 2. Recent session summaries (last 3 .md files sorted by name desc)
-    md_files = sorted(glob.glob(os.path.join(SESSIONS_DIR, "*.md")), reverse=True)
-    recent = md_files[:3]
+    # 2. Recent session summaries
     if recent:
         summary_parts = []
         for i, filepath in enumerate(recent, 1):
@@ -42,7 +72,10 @@ def get_context() -> str:
         if summary_parts:
             parts.append("[最近对话摘要]\n" + "\n\n".join(summary_parts))
 
-    return "\n\n".join(parts)
+    text = "\n\n".join(parts)
+    _context_cache["key"] = key
+    _context_cache["text"] = text
+    return text
 
 
 def build_context_prompt(user_input: str, is_first_message: bool = False) -> str:
@@ -57,16 +90,21 @@ def build_context_prompt(user_input: str, is_first_message: bool = False) -> str
     return user_input
 
 
+def _write_summary(path: str, summary: str):
+    ensure_brain_dirs()
+    with open(path, "w") as f:
+        f.write(summary)
+
+
 async def generate_summary(session_id: str) -> str:
     """
     Generate a summary for a session using Claude Code.
     Saves to ~/claude-brain/sessions/{timestamp}.md
     """
-    import aiosqlite
-    from chat.claude_code import call_claude_code
+    from chat.claude_code import run_claude_code
+    from database import db_pool
 
-    async with aiosqlite.connect(settings.DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_pool.reader() as db:
         cursor = await db.execute(
             "SELECT role, content FROM messages WHERE session_id = ? ORDER BY timestamp",
             (session_id,),
@@ -76,7 +114,7 @@ async def generate_summary(session_id: str) -> str:
     if not messages:
         return ""
 
-    conversation = "\n".join([f"{m['role']}: {m['content'][:500]}" for m in messages])
+    conversation = "\n".join(f"{m['role']}: {m['content'][:500]}" for m in messages)
     summary_prompt = f"""请总结以下对话的要点，包括：
 1. 做了什么
 2. 关键决策
@@ -87,22 +125,16 @@ async def generate_summary(session_id: str) -> str:
 对话内容：
 {conversation[:3000]}"""
 
-    result = []
-    async for chunk_text, chunk_type in call_claude_code(summary_prompt):
-        result.append(chunk_text)
-
-    summary = "".join(result).strip()
+    summary = (await run_claude_code(summary_prompt)).strip()
 
     # Save summary to database
-    async with aiosqlite.connect(settings.DATABASE_PATH) as db:
+    async with db_pool.writer() as db:
         await db.execute("UPDATE sessions SET summary = ? WHERE id = ?", (summary, session_id))
         await db.commit()
 
     # Save to brain directory with timestamp filename
-    ensure_brain_dirs()
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H%M%S")
     summary_path = os.path.join(SESSIONS_DIR, f"{timestamp}.md")
-    with open(summary_path, "w") as f:
-        f.write(summary)
+    await asyncio.to_thread(_write_summary, summary_path, summary)
 
     return summary
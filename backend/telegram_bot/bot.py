@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import os
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -34,6 +35,12 @@ async def start_telegram_bot():
 
     logger.info("Starting Telegram bot...")
 
+    # Photo/document uploads are saved here; create it once instead of per upload
+    try:
+        os.makedirs(settings.UPLOAD_PATH, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not create upload dir {settings.UPLOAD_PATH}: {e}")
+
     app = Application.builder().token(token).build()
 
     # Register command handlers
@@ -60,10 +67,9 @@ async def start_telegram_bot():
 
     logger.info("Telegram bot started successfully")
 
-    # Keep running until cancelled
+    # Keep running until cancelled; the event is never set, so this idles without waking up
     try:
-        while True:
-            await asyncio.sleep(1)
+        await asyncio.Event().wait()
     except asyncio.CancelledError:
         logger.info("Stopping Telegram bot...")
         await app.updater.stop()
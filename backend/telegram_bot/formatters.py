@@ -1,16 +1,28 @@
 import re
 
 
+# Each MarkdownV2 special character maps to its backslash-escaped form
+_MDV2_ESCAPES = str.maketrans({c: "\\" + c for c in r"_*[]()~`>#+-=|{}.!"})
+
+
 def escape_markdown_v2(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2 format."""
-    special_chars = r"_*[]()~`>#+-=|{}.!"
-    escaped = ""
-    for char in text:
-        if char in special_chars:
-            escaped += f"\\{char}"
-        else:
-            escaped += char
-    return escaped
+    return text.translate(_MDV2_ESCAPES)
+
+
+def _escape_code(text: str) -> str:
+    """Escape the text of a code or pre entity, where only \\ and ` are special."""
+    return text.replace("\\", "\\\\").replace("`", "\\`")
+
+
+# One alternation, tried in the old extraction order: code blocks, inline
+# code, bold, then italic
+_FORMAT_TOKENS = re.compile(
+    r"```(?P<lang>\w*)\n?(?P<block>(?s:.*?))```"
+    r"|`(?P<code>[^`]+)`"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|(?<!\*)\*(?P<italic>[^*]+?)\*(?!\*)"
+)
 
 
 def format_for_telegram(text: str) -> str:
@@ -21,73 +33,23 @@ def format_for_telegram(text: str) -> str:
     if not text:
         return ""
 
-    # Extract code blocks first to protect them
-    code_blocks = []
-    code_block_pattern = re.compile(r"```(\w*)\n?(.*?)```", re.DOTALL)
-
-    def replace_code_block(match):
-        lang = match.group(1)
-        code = match.group(2).rstrip("\n")
-        idx = len(code_blocks)
-        code_blocks.append((lang, code))
-        return f"__CODE_BLOCK_{idx}__"
-
-    text = code_block_pattern.sub(replace_code_block, text)
-
-    # Extract inline code
-    inline_codes = []
-    inline_pattern = re.compile(r"`([^`]+)`")
-
-    def replace_inline(match):
-        idx = len(inline_codes)
-        inline_codes.append(match.group(1))
-        return f"__INLINE_CODE_{idx}__"
-
-    text = inline_pattern.sub(replace_inline, text)
-
-    # Extract bold
-    bolds = []
-    bold_pattern = re.compile(r"\*\*(.+?)\*\*")
-
-    def replace_bold(match):
-        idx = len(bolds)
-        bolds.append(match.group(1))
-        return f"__BOLD_{idx}__"
-
-    text = bold_pattern.sub(replace_bold, text)
-
-    # Extract italic
-    italics = []
-    italic_pattern = re.compile(r"(?<!\*)\*([^*]+?)\*(?!\*)")
-
-    def replace_italic(match):
-        idx = len(italics)
-        italics.append(match.group(1))
-        return f"__ITALIC_{idx}__"
-
-    text = italic_pattern.sub(replace_italic, text)
-
-    # Escape remaining text
-    text = escape_markdown_v2(text)
-
-    # Restore formatting
-    for idx, content in enumerate(bolds):
-        text = text.replace(f"__BOLD_{idx}__", f"*{escape_markdown_v2(content)}*")
-
-    for idx, content in enumerate(italics):
-        text = text.replace(f"__ITALIC_{idx}__", f"_{escape_markdown_v2(content)}_")
-
-    for idx, code in enumerate(inline_codes):
-        text = text.replace(f"__INLINE\\_CODE\\_{idx}__", f"`{code}`")
-        # Also handle unescaped version in case
-        text = text.replace(f"__INLINE_CODE_{idx}__", f"`{code}`")
-
-    for idx, (lang, code) in enumerate(code_blocks):
-        block = f"```{lang}\n{code}\n```"
-        text = text.replace(f"__CODE\\_BLOCK\\_{idx}__", block)
-        text = text.replace(f"__CODE_BLOCK_{idx}__", block)
-
-    return text
+    # Single pass: escape the text between tokens, rewrite each token in place
+    out = []
+    pos = 0
+    for m in _FORMAT_TOKENS.finditer(text):
+        out.append(escape_markdown_v2(text[pos:m.start()]))
+        kind = m.lastgroup
+        if kind == "block":
+            out.append(f"```{m['lang']}\n{_escape_code(m['block'].rstrip(chr(10)))}\n```")
+        elif kind == "code":
+            out.append(f"`{_escape_code(m['code'])}`")
+        elif kind == "bold":
+            out.append(f"*{escape_markdown_v2(m['bold'])}*")
+        else:
+            out.append(f"_{escape_markdown_v2(m['italic'])}_")
+        pos = m.end()
+    out.append(escape_markdown_v2(text[pos:]))
+    return "".join(out)
 
 
 def split_message(text: str, max_length: int = 4000) -> list[str]:
@@ -98,22 +60,28 @@ def split_message(text: str, max_length: int = 4000) -> list[str]:
     if len(text) <= max_length:
         return [text]
 
+    # Walk an offset through the text instead of re-slicing the remainder each chunk
     chunks = []
-    while text:
-        if len(text) <= max_length:
-            chunks.append(text)
+    half = max_length // 2
+    pos, n = 0, len(text)
+    while pos < n:
+        if n - pos <= max_length:
+            chunks.append(text[pos:])
             break
 
+        limit = pos + max_length
         # Try to split at a newline
-        split_pos = text.rfind("\n", 0, max_length)
-        if split_pos == -1 or split_pos < max_length // 2:
+        split_pos = text.rfind("\n", pos, limit)
+        if split_pos == -1 or split_pos - pos < half:
             # Try to split at a space
-            split_pos = text.rfind(" ", 0, max_length)
-        if split_pos == -1 or split_pos < max_length // 2:
+            split_pos = text.rfind(" ", pos, limit)
+        if split_pos == -1 or split_pos - pos < half:
             # Force split at max_length
-            split_pos = max_length
+            split_pos = limit
 
-        chunks.append(text[:split_pos])
-        text = text[split_pos:].lstrip("\n")
+        chunks.append(text[pos:split_pos])
+        pos = split_pos
+        while pos < n and text[pos] == "\n":
+            pos += 1
 
     return chunks
@@ -1,15 +1,18 @@
 import asyncio
 import os
-import re as re_module
-import json
+import re
 import shutil
 import logging
+import platform
+import time
+from functools import lru_cache
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
 
 from chat.claude_code import call_claude_code
 from sessions.brain import build_context_prompt
+from projects.router import load_projects
 from telegram_bot.security import is_authorized
 from telegram_bot.formatters import format_for_telegram, split_message
 from config import settings
@@ -20,36 +23,70 @@ logger = logging.getLogger(__name__)
 _user_work_dirs: dict[int, str] = {}
 _active_tasks: dict[int, asyncio.Task] = {}
 _user_new_session: dict[int, bool] = {}  # True = next message starts fresh (no --continue)
+# Fire-and-forget tasks, referenced here until done so they aren't garbage-collected
+_background_tasks: set[asyncio.Task] = set()
 
 # Global auth process — must stay alive for OAuth callback
 _auth_process: asyncio.subprocess.Process | None = None
 _auth_wait_task: asyncio.Task | None = None
 
+# Doesn't change while the process runs
+_OS_NAME = f"{platform.system()} {platform.release()}"
+
+# Telegram rejects longer messages; sends are capped bot-wide to stay under its ~30 msg/s limit
+TELEGRAM_MAX_MESSAGE = 4096
+_send_limiter = asyncio.Semaphore(25)
+# File uploads in flight; each holds up to 50MB in memory until Telegram accepts it
+_upload_limiter = asyncio.Semaphore(3)
+# Buffered Claude output is sent once it grows past this, keeping each batch near one message
+STREAM_FLUSH_CHARS = 3500
+# Characters MarkdownV2 escapes or formats, plus the backslash escape itself
+_MD_SPECIAL_RE = re.compile(r"[_*\[\]()~`>#+\-=|{}.!\\]")
+
+# Last successful auth check as (monotonic time, result); failures are never cached
+AUTH_CACHE_TTL = 60
+_auth_cache: tuple[float, dict] | None = None
+
+
+# Compiled once; these run on every Claude response
+_URL_RE = re.compile(r'https?://[^\s<>"\')\]]+')
+# Sent with reply_photo; anything else goes as a document
+_IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp"})
+# File paths Claude reports as written, e.g. 'Created file: ...', '[Write] ...',
+# found in a single pass; the path is in group "said" or "write"
+_FILE_RE = re.compile(
+    r"(?:Created|Wrote to|Saved to|Generated|Output to)[:\s]+[`'\"]?(?P<said>[^\s`'\"]+\.\w+)"
+    r"|\[Write\]\s+(?P<write>[^\s]+\.\w+)",
+    re.IGNORECASE,
+)
+
+
+# Phrases in a Claude response that mean the CLI needs to log in again, matched
+# case-insensitively in one pass. "auth", "401" and "403" only count as whole
+# words, so "author" or a line number like 4013 doesn't trigger a re-login.
+_AUTH_ERROR_RE = re.compile(
+    r"not logged in|please run /login|unauthorized|token expired|authentication required"
+    r"|\bauth\b|login required|\b401\b|\b403\b|credential|not authenticated",
+    re.IGNORECASE,
+)
+# Unambiguous subset, safe to act on before the CLI has exited
+_LOGGED_OUT_RE = re.compile(
+    r"not logged in|please run /login|login required|not authenticated|authentication required|token expired",
+    re.IGNORECASE,
+)
+
 
 # --------------- Claude Code Auth Helpers ---------------
 
-def _extract_urls(text: str) -> list[str]:
-    """Extract URLs from text (for capturing OAuth links)."""
-    return re_module.findall(r'https?://[^\s<>"\')\]]+', text)
+def _first_url(text: str) -> str | None:
+    """First URL in text (for capturing OAuth links)."""
+    m = _URL_RE.search(text)
+    return m.group(0) if m else None
 
 
 def _is_auth_error(text: str) -> bool:
     """Check if text indicates an authentication error."""
-    lower = text.lower()
-    auth_patterns = [
-        "not logged in",
-        "please run /login",
-        "unauthorized",
-        "token expired",
-        "authentication required",
-        "auth",
-        "login required",
-        "401",
-        "403",
-        "credential",
-        "not authenticated",
-    ]
-    return any(p in lower for p in auth_patterns)
+    return _AUTH_ERROR_RE.search(text) is not None
 
 
 async def _check_claude_auth() -> dict:
@@ -57,6 +94,10 @@ async def _check_claude_auth() -> dict:
     Quick check if Claude Code CLI is authenticated.
     Returns {"ok": True/False, "detail": str}
     """
+    global _auth_cache
+    if _auth_cache and time.monotonic() - _auth_cache[0] < AUTH_CACHE_TTL:
+        return _auth_cache[1]
+
     try:
         proc = await asyncio.create_subprocess_exec(
             "claude", "-p", "hi", "--output-format", "json",
@@ -64,20 +105,57 @@ async def _check_claude_auth() -> dict:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=30)
+    except FileNotFoundError:
+        return {"ok": False, "detail": "Claude Code CLI not found. Is it installed?"}
+    except Exception as e:
+        return {"ok": False, "detail": f"Error: {str(e)}"}
+
+    async def _run() -> tuple[bytes, bytes]:
+        stdout_task = asyncio.create_task(proc.stdout.read())
+        stderr_lines = []
+        try:
+            while line := await proc.stderr.readline():
+                stderr_lines.append(line)
+                if _LOGGED_OUT_RE.search(line.decode("utf-8", errors="replace")):
+                    # A logged-out CLI says so on stderr; don't wait for it to give up
+                    try:
+                        proc.kill()
+                    except ProcessLookupError:
+                        pass
+                    return b"", b"".join(stderr_lines)
+            return await stdout_task, b"".join(stderr_lines)
+        finally:
+            # Also reached when wait_for times out and cancels _run
+            if not stdout_task.done():
+                stdout_task.cancel()
+
+    try:
+        stdout, stderr = await asyncio.wait_for(_run(), timeout=30)
+        await proc.wait()
 
         if proc.returncode == 0:
-            return {"ok": True, "detail": "Authenticated and working."}
+            result = {"ok": True, "detail": "Authenticated and working."}
+            _auth_cache = (time.monotonic(), result)
+            return result
 
-        combined = stdout.decode("utf-8", errors="replace") + "\n" + stderr.decode("utf-8", errors="replace")
-        return {"ok": False, "detail": combined.strip()[:500]}
+        # Only the first 500 characters are shown, so decode at most the bytes that can hold them
+        combined = (stdout + b"\n" + stderr).strip()
+        detail = combined[:500 * 4].decode("utf-8", errors="replace").strip()[:500]
+        return {"ok": False, "detail": detail}
 
     except asyncio.TimeoutError:
         return {"ok": False, "detail": "Timed out (30s). May be stuck on an auth prompt."}
-    except FileNotFoundError:
-        return {"ok": False, "detail": "Claude Code CLI not found. Is it installed?"}
     except Exception as e:
         return {"ok": False, "detail": f"Error: {str(e)}"}
+    finally:
+        # Any exit that didn't see the CLI finish (timeout, an over-long stderr
+        # line, cancellation): kill it so it can't block on a full pipe, and reap it
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
 
 
 async def _trigger_reauth(notify_chat_id: int = None, bot=None) -> dict:
@@ -87,7 +165,10 @@ async def _trigger_reauth(notify_chat_id: int = None, bot=None) -> dict:
 
     Returns {"auth_url": str|None, "output": str}
     """
-    global _auth_process, _auth_wait_task
+    global _auth_process, _auth_wait_task, _auth_cache
+
+    # Re-auth means the CLI is (about to be) logged out; don't report a cached success
+    _auth_cache = None
 
     # Kill any previous auth process
     if _auth_process and _auth_process.returncode is None:
@@ -129,9 +210,8 @@ async def _trigger_reauth(notify_chat_id: int = None, bot=None) -> dict:
                 all_output.append(text)
                 logger.info(f"claude auth: {text.strip()}")
                 if auth_url is None:
-                    urls = _extract_urls(text)
-                    if urls:
-                        auth_url = urls[0]
+                    auth_url = _first_url(text)
+                    if auth_url:
                         url_found.set()
         except Exception:
             pass
@@ -182,6 +262,27 @@ async def _trigger_reauth(notify_chat_id: int = None, bot=None) -> dict:
         return {"auth_url": None, "output": "".join(all_output).strip() or "No auth URL found in CLI output."}
 
 
+def _forget_task(user_id: int, task: asyncio.Task):
+    # Done callback rather than a finally block: it also runs for a task cancelled
+    # before it started, and leaves alone a newer task started after /cancel
+    if _active_tasks.get(user_id) is task:
+        del _active_tasks[user_id]
+
+
+@lru_cache(maxsize=1)
+def _claude_available(minute: int) -> bool:
+    """Whether the CLI is on PATH; the minute argument makes the answer expire each minute."""
+    return shutil.which("claude") is not None
+
+
+def _read_upload(path: str, max_size: int) -> bytes | None:
+    """File contents, or None if it is larger than max_size."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > max_size:
+            return None
+        return f.read()
+
+
 def _get_work_dir(user_id: int) -> str:
     return _user_work_dirs.get(user_id, settings.TELEGRAM_DEFAULT_WORK_DIR)
 
@@ -192,14 +293,33 @@ def _auth_check(user_id: int) -> bool:
     return True
 
 
+async def _send_typing(bot, chat_id: int):
+    try:
+        await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    except Exception as e:
+        logger.debug(f"Failed to send typing action: {e}")
+
+
 async def _send_long_text(update: Update, text: str):
     """Send text, splitting if needed. Try MarkdownV2 first, fallback to plain text."""
     chunks = split_message(text)
     for chunk in chunks:
-        try:
-            formatted = format_for_telegram(chunk)
-            await update.message.reply_text(formatted, parse_mode=ParseMode.MARKDOWN_V2)
-        except Exception:
+        formatted = None
+        # Without MarkdownV2-significant characters plain text renders the same
+        if _MD_SPECIAL_RE.search(chunk):
+            try:
+                formatted = format_for_telegram(chunk)
+            except Exception:
+                pass
+        async with _send_limiter:
+            # Escaping can push a chunk past Telegram's limit; that send would
+            # only be rejected, so go straight to plain text
+            if formatted is not None and len(formatted) <= TELEGRAM_MAX_MESSAGE:
+                try:
+                    await update.message.reply_text(formatted, parse_mode=ParseMode.MARKDOWN_V2)
+                    continue
+                except Exception:
+                    pass
             # Fallback to plain text
             try:
                 await update.message.reply_text(chunk)
@@ -209,8 +329,10 @@ async def _send_long_text(update: Update, text: str):
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
     text = (
@@ -226,35 +348,41 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/cancel - Cancel current task\n"
         "/help - Show this help"
     )
-    await update.message.reply_text(text)
+    await msg.reply_text(text)
 
 
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
     await start_handler(update, context)
 
 
 async def pwd_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /pwd command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
-    work_dir = _get_work_dir(update.effective_user.id)
-    await update.message.reply_text(f"Current directory: {work_dir}")
+    work_dir = _get_work_dir(user_id)
+    await msg.reply_text(f"Current directory: {work_dir}")
 
 
 async def cd_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /cd <path> command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
     if not context.args:
-        await update.message.reply_text("Usage: /cd <path>")
+        await msg.reply_text("Usage: /cd <path>")
         return
 
     new_path = " ".join(context.args)
@@ -262,36 +390,36 @@ async def cd_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Resolve relative paths against current work dir
     if not os.path.isabs(new_path):
-        new_path = os.path.join(_get_work_dir(update.effective_user.id), new_path)
+        new_path = os.path.join(_get_work_dir(user_id), new_path)
     new_path = os.path.normpath(new_path)
 
-    if not os.path.isdir(new_path):
-        await update.message.reply_text(f"Directory not found: {new_path}")
+    # The path may be on a slow or network mount; stat it off the event loop
+    if not await asyncio.to_thread(os.path.isdir, new_path):
+        await msg.reply_text(f"Directory not found: {new_path}")
         return
 
-    _user_work_dirs[update.effective_user.id] = new_path
-    await update.message.reply_text(f"Switched to: {new_path}")
+    _user_work_dirs[user_id] = new_path
+    await msg.reply_text(f"Switched to: {new_path}")
 
 
 async def projects_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /projects command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
-    projects_file = os.path.join(settings.CLAUDE_BRAIN_PATH, "projects.json")
-    if not os.path.exists(projects_file):
-        await update.message.reply_text("No projects configured.")
+    data = await asyncio.to_thread(load_projects)
+    if data is None:
+        await msg.reply_text("No projects configured.")
         return
 
-    with open(projects_file, "r") as f:
-        data = json.load(f)
-
     projects = data.get("projects", [])
     active = data.get("active")
 
     if not projects:
-        await update.message.reply_text("No projects configured.")
+        await msg.reply_text("No projects configured.")
         return
 
     lines = ["Projects:\n"]
@@ -299,132 +427,160 @@ async def projects_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         marker = " [active]" if p.get("name") == active else ""
         lines.append(f"  {p['name']}: {p['path']}{marker}")
     lines.append(f"\nUse /cd <path> to switch directory")
-    await update.message.reply_text("\n".join(lines))
+    await msg.reply_text("\n".join(lines))
 
 
 async def status_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /status command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
     # Gather system info
-    import platform
     try:
         load_avg = os.getloadavg()
         load_str = f"{load_avg[0]:.1f} / {load_avg[1]:.1f} / {load_avg[2]:.1f}"
     except OSError:
         load_str = "N/A"
 
-    disk = shutil.disk_usage("/")
+    disk = await asyncio.to_thread(shutil.disk_usage, "/")
     disk_total = disk.total / (1024 ** 3)
     disk_used = disk.used / (1024 ** 3)
     disk_pct = (disk.used / disk.total) * 100
 
     # Check Claude Code availability
-    claude_ok = shutil.which("claude") is not None
+    claude_ok = _claude_available(int(time.monotonic() // 60))
 
-    user_id = update.effective_user.id
     work_dir = _get_work_dir(user_id)
-    has_active = user_id in _active_tasks and not _active_tasks[user_id].done()
+    task = _active_tasks.get(user_id)
+    has_active = task is not None and not task.done()
 
     text = (
         f"Server Status\n\n"
-        f"OS: {platform.system()} {platform.release()}\n"
+        f"OS: {_OS_NAME}\n"
         f"Load: {load_str}\n"
         f"Disk: {disk_used:.1f}G / {disk_total:.1f}G ({disk_pct:.0f}%)\n"
         f"Claude CLI: {'Available' if claude_ok else 'Not found'}\n"
         f"Work dir: {work_dir}\n"
         f"Active task: {'Yes' if has_active else 'No'}"
     )
-    await update.message.reply_text(text)
+    await msg.reply_text(text)
 
 
 async def new_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /new command — start a fresh conversation (clear context)."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
-    _user_new_session[update.effective_user.id] = True
-    await update.message.reply_text("Context cleared. Next message starts a new conversation.")
+    _user_new_session[user_id] = True
+    await msg.reply_text("Context cleared. Next message starts a new conversation.")
 
 
 async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /cancel command."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
-    user_id = update.effective_user.id
     task = _active_tasks.get(user_id)
     if task and not task.done():
         task.cancel()
         del _active_tasks[user_id]
-        await update.message.reply_text("Task cancelled.")
+        await msg.reply_text("Task cancelled.")
     else:
-        await update.message.reply_text("No active task to cancel.")
+        await msg.reply_text("No active task to cancel.")
 
 
 async def auth_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /auth or /login command — check auth and send OAuth link if needed."""
-    if not _auth_check(update.effective_user.id):
-        await update.message.reply_text("Unauthorized.")
+    user_id = update.effective_user.id
+    msg = update.message
+    if not _auth_check(user_id):
+        await msg.reply_text("Unauthorized.")
         return
 
-    await update.message.reply_text("Checking Claude Code authentication...")
+    await msg.reply_text("Checking Claude Code authentication...")
 
     result = await _check_claude_auth()
 
     if result["ok"]:
-        await update.message.reply_text("Claude Code is authenticated and working!")
+        await msg.reply_text("Claude Code is authenticated and working!")
         return
 
     # Not authenticated — trigger login and get URL
-    await update.message.reply_text("Not authenticated. Getting login link...")
+    await msg.reply_text("Not authenticated. Getting login link...")
 
     chat_id = update.effective_chat.id
     reauth = await _trigger_reauth(notify_chat_id=chat_id, bot=context.bot)
 
     if reauth["auth_url"]:
-        await update.message.reply_text(
+        await msg.reply_text(
             "Open this link in your browser to log in:\n\n"
             f"{reauth['auth_url']}\n\n"
             "After you log in, I'll notify you automatically."
         )
     else:
-        msg = "Could not get a login link.\n\n"
+        text = "Could not get a login link.\n\n"
         if reauth["output"]:
-            msg += f"CLI output:\n{reauth['output'][:500]}"
-        await update.message.reply_text(msg)
+            text += f"CLI output:\n{reauth['output'][:500]}"
+        await msg.reply_text(text)
 
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle regular text messages - send to Claude Code."""
     user_id = update.effective_user.id
+    msg = update.message
     if not _auth_check(user_id):
-        await update.message.reply_text("Unauthorized.")
+        await msg.reply_text("Unauthorized.")
         return
 
-    content = update.message.text or ""
+    content = msg.text or ""
     if not content.strip():
         return
 
-    # Check if there's already an active task
+    await _process_prompt(update, context, content)
+
+
+async def _process_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, content: str):
+    """Run a prompt through Claude Code for an authorized user and reply with the output."""
+    user_id = update.effective_user.id
+    msg = update.message
+
+    # Check if there's already an active task. Nothing may be awaited between
+    # this check and registering the new task below, or two messages could both pass it
     existing = _active_tasks.get(user_id)
     if existing and not existing.done():
-        await update.message.reply_text("A task is already running. Use /cancel to stop it first.")
+        await msg.reply_text("A task is already running. Use /cancel to stop it first.")
         return
 
-    # Send processing indicator
-    status_msg = await update.message.reply_text("Processing...")
-
     async def run_claude():
+        status_msg = None
+
+        async def report(text: str):
+            """Show a failure on the status message, or as a new reply once it's been deleted."""
+            try:
+                if status_msg is not None:
+                    await status_msg.edit_text(text)
+                else:
+                    await msg.reply_text(text)
+            except Exception:
+                pass
+
         try:
-            await context.bot.send_chat_action(
-                chat_id=update.effective_chat.id,
-                action=ChatAction.TYPING
-            )
+            # Send processing indicator
+            status_msg = await msg.reply_text("Processing...")
+
+            # Don't hold up the CLI for the typing indicator's round-trip
+            typing = asyncio.create_task(_send_typing(context.bot, update.effective_chat.id))
+            _background_tasks.add(typing)
+            typing.add_done_callback(_background_tasks.discard)
 
             work_dir = _get_work_dir(user_id)
 
@@ -434,169 +590,199 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             full_prompt = build_context_prompt(content, is_first_message=start_fresh)
 
-            # Collect the full output
+            # Send output in batches as it arrives rather than holding all of it
             final_result = ""
-            full_output_parts = []
+            buf = []
+            buf_len = 0
+            streamed = False
+            mentioned = set()
 
             async for chunk_text, chunk_type in call_claude_code(full_prompt, working_dir=work_dir, continue_session=use_continue):
                 if chunk_type == "result":
                     final_result = chunk_text
                 elif chunk_type in ("text", "tool_use", "tool_result", "error"):
-                    full_output_parts.append(chunk_text)
-
-            # Use final_result if available, otherwise join all parts
-            response = final_result if final_result else "\n".join(full_output_parts)
+                    buf.append(chunk_text)
+                    buf_len += len(chunk_text)
+                    if buf_len > STREAM_FLUSH_CHARS:
+                        batch = "\n".join(buf)
+                        buf.clear()
+                        buf_len = 0
+                        if not streamed:
+                            streamed = True
+                            try:
+                                await status_msg.delete()
+                            except Exception:
+                                pass
+                            status_msg = None
+                        mentioned |= _mentioned_files(batch, work_dir)
+                        await _send_long_text(update, batch)
+
+            # The result repeats what was already streamed, so it is only
+            # used when the whole run fit in one batch
+            if streamed:
+                response = "\n".join(buf)
+            else:
+                response = final_result if final_result else "\n".join(buf)
 
-            if not response.strip():
-                response = "(No output from Claude Code)"
+                if not response.strip():
+                    response = "(No output from Claude Code)"
 
-            # Delete the "Processing..." message
-            try:
-                await status_msg.delete()
-            except Exception:
-                pass
+                # Delete the "Processing..." message
+                try:
+                    await status_msg.delete()
+                except Exception:
+                    pass
+                status_msg = None
 
-            # Detect auth errors and auto-trigger login
-            if _is_auth_error(response):
-                await update.message.reply_text(
+            # Detect auth errors and auto-trigger login. A streamed run can still
+            # end in one, so check what the CLI said last
+            if _is_auth_error(final_result or response):
+                await msg.reply_text(
                     "Claude Code is not logged in. Getting login link..."
                 )
                 chat_id = update.effective_chat.id
                 reauth = await _trigger_reauth(notify_chat_id=chat_id, bot=context.bot)
 
                 if reauth["auth_url"]:
-                    await update.message.reply_text(
+                    await msg.reply_text(
                         "Open this link in your browser to log in:\n\n"
                         f"{reauth['auth_url']}\n\n"
                         "After you log in, resend your message."
                     )
                 else:
-                    await update.message.reply_text(
+                    await msg.reply_text(
                         "Could not get login link. Run /auth to try again.\n\n"
                         f"CLI output:\n{reauth['output'][:300]}"
                     )
                 return
 
-            else:
+            elif response:
                 # Send the response
                 await _send_long_text(update, response)
 
             # Check if Claude generated any files we should send
-            await _check_and_send_files(update, response, work_dir)
+            mentioned |= _mentioned_files(response, work_dir)
+            await _check_and_send_files(update, mentioned)
 
         except asyncio.CancelledError:
-            try:
-                await status_msg.edit_text("Task cancelled.")
-            except Exception:
-                pass
+            await report("Task cancelled.")
         except FileNotFoundError as e:
             logger.error(f"Claude Code not found: {e}")
-            try:
-                error_msg = (
-                    "Claude Code CLI not found.\n\n"
-                    "Please install it:\n"
-                    "npm install -g @anthropic-ai/claude-code\n\n"
-                    "Or check that the working directory exists:\n"
-                    f"{_get_work_dir(user_id)}"
-                )
-                await status_msg.edit_text(error_msg)
-            except Exception:
-                pass
+            await report(
+                "Claude Code CLI not found.\n\n"
+                "Please install it:\n"
+                "npm install -g @anthropic-ai/claude-code\n\n"
+                "Or check that the working directory exists:\n"
+                f"{_get_work_dir(user_id)}"
+            )
         except Exception as e:
             logger.error(f"Claude Code error: {e}")
-            try:
-                await status_msg.edit_text(f"Error: {str(e)[:500]}")
-            except Exception:
-                pass
-        finally:
-            _active_tasks.pop(user_id, None)
+            await report(f"Error: {str(e)[:500]}")
 
     task = asyncio.create_task(run_claude())
     _active_tasks[user_id] = task
+    task.add_done_callback(lambda t: _forget_task(user_id, t))
+
+
+async def _download(file, file_path: str):
+    """Download into the upload dir, which the bot creates at startup."""
+    try:
+        await file.download_to_drive(file_path)
+    except FileNotFoundError:
+        # The dir was removed while the bot was running
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        await file.download_to_drive(file_path)
 
 
 async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle photo messages - save and pass to Claude Code."""
     user_id = update.effective_user.id
+    msg = update.message
     if not _auth_check(user_id):
-        await update.message.reply_text("Unauthorized.")
+        await msg.reply_text("Unauthorized.")
         return
 
     # Get the highest resolution photo
-    photo = update.message.photo[-1]
+    photo = msg.photo[-1]
     file = await context.bot.get_file(photo.file_id)
 
     # Save to uploads dir
-    upload_dir = settings.UPLOAD_PATH
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, f"tg_{photo.file_id}.jpg")
-    await file.download_to_drive(file_path)
+    file_path = os.path.join(settings.UPLOAD_PATH, f"tg_{photo.file_id}.jpg")
+    await _download(file, file_path)
 
-    caption = update.message.caption or "Please analyze this image."
+    caption = msg.caption or "Please analyze this image."
     prompt = f"{caption}\n\n[Attached image: {file_path}]"
 
-    # Reuse message handler logic
-    update.message.text = prompt
-    await message_handler(update, context)
+    # Telegram objects are immutable, so pass the prompt along instead of
+    # rewriting msg.text
+    await _process_prompt(update, context, prompt)
 
 
 async def document_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle document uploads - save and pass to Claude Code."""
     user_id = update.effective_user.id
+    msg = update.message
     if not _auth_check(user_id):
-        await update.message.reply_text("Unauthorized.")
+        await msg.reply_text("Unauthorized.")
         return
 
-    doc = update.message.document
+    doc = msg.document
     file = await context.bot.get_file(doc.file_id)
 
-    upload_dir = settings.UPLOAD_PATH
-    os.makedirs(upload_dir, exist_ok=True)
     file_name = doc.file_name or f"tg_{doc.file_id}"
-    file_path = os.path.join(upload_dir, file_name)
-    await file.download_to_drive(file_path)
+    file_path = os.path.join(settings.UPLOAD_PATH, file_name)
+    await _download(file, file_path)
 
-    caption = update.message.caption or f"I've uploaded a file: {file_name}. Please review it."
+    caption = msg.caption or f"I've uploaded a file: {file_name}. Please review it."
     prompt = f"{caption}\n\n[Attached file: {file_path}]"
 
-    update.message.text = prompt
-    await message_handler(update, context)
+    await _process_prompt(update, context, prompt)
 
 
-async def _check_and_send_files(update: Update, response: str, work_dir: str):
+def _mentioned_files(response: str, work_dir: str) -> set:
     """
-    Check if the Claude Code response mentions created/modified files and send them.
+    Paths of files the Claude Code response says it created/modified.
     Looks for common patterns like 'Created file: ...', 'Wrote to ...', etc.
     """
-    import re
-    patterns = [
-        r"(?:Created|Wrote to|Saved to|Generated|Output to)[:\s]+[`'\"]?([^\s`'\"]+\.\w+)",
-        r"\[Write\]\s+([^\s]+\.\w+)",
-    ]
-    files_to_send = set()
-    for pattern in patterns:
-        for match in re.finditer(pattern, response, re.IGNORECASE):
-            fpath = match.group(1)
-            if not os.path.isabs(fpath):
-                fpath = os.path.join(work_dir, fpath)
-            if os.path.isfile(fpath):
-                files_to_send.add(fpath)
-
-    for fpath in list(files_to_send)[:5]:  # Limit to 5 files
-        try:
-            file_size = os.path.getsize(fpath)
-            if file_size > 50 * 1024 * 1024:  # Skip files > 50MB
-                continue
-            ext = os.path.splitext(fpath)[1].lower()
-            if ext in (".png", ".jpg", ".jpeg", ".gif", ".webp"):
-                await update.message.reply_photo(
-                    photo=open(fpath, "rb"),
-                    caption=os.path.basename(fpath)
-                )
-            else:
-                await update.message.reply_document(
-                    document=open(fpath, "rb"),
-                    filename=os.path.basename(fpath)
-                )
-        except Exception as e:
-            logger.warning(f"Failed to send file {fpath}: {e}")
+    candidates = set()
+    for match in _FILE_RE.finditer(response):
+        fpath = match["said"] or match["write"]
+        if not os.path.isabs(fpath):
+            fpath = os.path.join(work_dir, fpath)
+        candidates.add(fpath)
+    return candidates
+
+
+async def _check_and_send_files(update: Update, candidates: set):
+    """Send the mentioned files that exist."""
+    if not candidates:
+        return
+
+    # All the stat calls in one trip to a worker thread
+    files_to_send = await asyncio.to_thread(lambda: [p for p in candidates if os.path.isfile(p)])
+
+    # Limit to 5 files, uploaded concurrently (at most 3 at a time)
+    await asyncio.gather(*(_send_file(update, fpath) for fpath in files_to_send[:5]))
+
+
+async def _send_file(update: Update, fpath: str):
+    try:
+        async with _upload_limiter:
+            # Read in a worker thread (skips files > 50MB) instead of handing
+            # the bot a blocking file object
+            data = await asyncio.to_thread(_read_upload, fpath, 50 * 1024 * 1024)
+            if data is None:
+                return
+            async with _send_limiter:
+                if os.path.splitext(fpath)[1].lower() in _IMAGE_EXTS:
+                    await update.message.reply_photo(
+                        photo=data,
+                        caption=os.path.basename(fpath)
+                    )
+                else:
+                    await update.message.reply_document(
+                        document=data,
+                        filename=os.path.basename(fpath)
+                    )
+    except Exception as e:
+        logger.warning(f"Failed to send file {fpath}: {e}")
@@ -1,22 +1,16 @@
+from functools import lru_cache
 from config import settings
 
 
-def get_allowed_users() -> set[int]:
-    """Parse TELEGRAM_ALLOWED_USERS env var into a set of user IDs."""
-    raw = settings.TELEGRAM_ALLOWED_USERS.strip()
-    if not raw:
-        return set()
-    result = set()
-    for part in raw.split(","):
-        part = part.strip()
-        if part.isdigit():
-            result.add(int(part))
-    return result
+@lru_cache(maxsize=1)
+def get_allowed_users() -> frozenset[int]:
+    """Parse TELEGRAM_ALLOWED_USERS env var into a set of user IDs (once; settings don't change at runtime)."""
+    return frozenset(
+        int(part) for part in settings.TELEGRAM_ALLOWED_USERS.split(",")
+        if part.strip().isdigit()
+    )
 
 
 def is_authorized(user_id: int) -> bool:
-    """Check if a Telegram user ID is in the whitelist."""
-    allowed = get_allowed_users()
-    if not allowed:
-        return False
-    return user_id in allowed
+    """Check if a Telegram user ID is in the whitelist. An empty whitelist allows no one."""
+    return user_id in get_allowed_users()
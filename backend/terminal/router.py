@@ -1,11 +1,17 @@
 import asyncio
+import codecs
 import json
 import os
+import re
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from auth.jwt import verify_token_from_string
 
 router = APIRouter(tags=["terminal"])
 
+# read() returns whatever is buffered up to this size, so fast output goes out
+# in a few large frames while slow output still arrives as soon as it's written
+OUTPUT_READ_SIZE = 65536
+
 # Dangerous command patterns to block
 BLOCKED_COMMANDS = [
     "rm -rf /",
@@ -15,14 +21,12 @@ BLOCKED_COMMANDS = [
     "dd if=/dev/zero of=/dev/sda",
     "chmod -R 777 /",
 ]
+# All patterns in one case-insensitive pass over the command, without a lowercased copy
+_BLOCKED_RE = re.compile("|".join(map(re.escape, BLOCKED_COMMANDS)), re.IGNORECASE)
 
 
 def is_blocked(command: str) -> bool:
-    cmd = command.strip().lower()
-    for blocked in BLOCKED_COMMANDS:
-        if blocked in cmd:
-            return True
-    return False
+    return _BLOCKED_RE.search(command) is not None
 
 
 @router.websocket("/api/terminal/ws")
@@ -96,17 +100,21 @@ async def terminal_websocket(websocket: WebSocket, token: str = ""):
                     env={**os.environ, "TERM": "dumb", "COLUMNS": "120"},
                 )
 
-                # Stream output
-                while True:
-                    chunk = await process.stdout.read(512)
-                    if not chunk:
-                        break
-                    await websocket.send_json({
-                        "type": "output",
-                        "content": chunk.decode("utf-8", errors="replace"),
-                    })
-
-                await process.wait()
+                # Stream output; the incremental decoder holds back a multi-byte
+                # character split across two reads instead of mangling it
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+                async def drain():
+                    while True:
+                        chunk = await process.stdout.read(OUTPUT_READ_SIZE)
+                        text = decoder.decode(chunk, final=not chunk)
+                        if text:
+                            await websocket.send_json({"type": "output", "content": text})
+                        if not chunk:
+                            break
+
+                # Reap the process while its output is still being forwarded
+                await asyncio.gather(drain(), process.wait())
                 await websocket.send_json({
                     "type": "exit",
                     "code": process.returncode,
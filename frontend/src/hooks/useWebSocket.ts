@@ -28,6 +28,14 @@ export function useWebSocket() {
             type: data.chunk_type || "text",
           });
           break;
+        case "chunks":
+          for (const item of data.items) {
+            appendStreamChunk({
+              content: item.content,
+              type: item.chunk_type || "text",
+            });
+          }
+          break;
         case "done": {
           setStreaming(false);
           const chunks = useChatStore.getState().streamChunks;